@@ -0,0 +1,179 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+
+"""Asyncio front-end of the NexusClient (requires Python 3.5+).
+
+The repositories of a wrapped NexusClient are exposed as coroutines. The blocking HTTP calls are dispatched to a
+bounded thread pool which is shared by all repositories of the client, so many requests can be in flight while the
+event loop stays responsive.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from pyxus.client import NexusClient
+from pyxus.resources.repository import ResolveAllError
+
+
+class AsyncRepository(object):
+
+    def __init__(self, repository, executor):
+        self._repository = repository
+        self._executor = executor
+        self.path = repository.path
+        self.constructor = repository.constructor
+
+    async def _run(self, method, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(method, *args, **kwargs))
+
+    async def create(self, entity):
+        return await self._run(self._repository.create, entity)
+
+    async def update(self, entity):
+        return await self._run(self._repository.update, entity)
+
+    async def delete(self, entity, revision=None):
+        return await self._run(self._repository.delete, entity, revision)
+
+    async def read(self, *args, **kwargs):
+        return await self._run(self._repository.read, *args, **kwargs)
+
+    async def resolve(self, search_result):
+        return await self._run(self._repository.resolve, search_result)
+
+    async def resolve_all(self, search_result_list, max_workers=None):
+        """Resolve all search results on the event loop - see Repository.resolve_all.
+
+        Arguments:
+            max_workers -- the maximal number of resolutions in flight (bounded by the thread pool of the client anyway)
+        """
+        semaphore = asyncio.Semaphore(max_workers) if max_workers else None
+
+        async def resolve(search_result):
+            if semaphore is None:
+                return await self.resolve(search_result)
+            async with semaphore:
+                return await self.resolve(search_result)
+
+        outcomes = await asyncio.gather(*[resolve(search_result) for search_result in search_result_list.results],
+                                        return_exceptions=True)
+        errors = dict((index, outcome) for index, outcome in enumerate(outcomes) if isinstance(outcome, Exception))
+        if errors:
+            raise ResolveAllError([None if index in errors else outcome for index, outcome in enumerate(outcomes)], errors)
+        return outcomes
+
+    async def list(self, *args, **kwargs):
+        return await self._run(self._repository.list, *args, **kwargs)
+
+    async def list_all(self, *args, **kwargs):
+        return await self._run(self._repository.list_all, *args, **kwargs)
+
+    async def list_by_full_subpath(self, subpath, resolved=False, deprecated=False):
+        return await self._run(self._repository.list_by_full_subpath, subpath, resolved, deprecated)
+
+    async def list_by_full_path(self, path, deprecated=False):
+        return await self._run(self._repository.list_by_full_path, path, deprecated)
+
+    async def find_by_identifier(self, subpath, value, resolved=False, deprecated=False):
+        return await self._run(self._repository.find_by_identifier, subpath, value, resolved=resolved, deprecated=deprecated)
+
+    async def find_by_field(self, subpath, field_path, value, resolved=False, deprecated=False):
+        return await self._run(self._repository.find_by_field, subpath, field_path, value, resolved=resolved, deprecated=deprecated)
+
+    async def fulltext_search(self, value, subpath=None, resolved=False, deprecated=False):
+        return await self._run(self._repository.fulltext_search, value, subpath=subpath, resolved=resolved, deprecated=deprecated)
+
+
+class AsyncOrganizationRepository(AsyncRepository):
+    pass
+
+
+class AsyncDomainRepository(AsyncRepository):
+    pass
+
+
+class AsyncSchemaRepository(AsyncRepository):
+
+    async def publish(self, entity, publish, revision=None):
+        return await self._run(self._repository.publish, entity, publish, revision)
+
+
+class AsyncInstanceRepository(AsyncRepository):
+
+    async def read_by_full_id(self, full_id, revision=None):
+        return await self._run(self._repository.read_by_full_id, full_id, revision)
+
+    async def list_by_schema(self, organization, domain, schema, version, **kwargs):
+        return await self._run(self._repository.list_by_schema, organization, domain, schema, version, **kwargs)
+
+
+class AsyncContextRepository(AsyncRepository):
+
+    async def publish(self, entity, publish, revision=None):
+        return await self._run(self._repository.publish, entity, publish, revision)
+
+
+class AsyncNexusClient(object):
+    """Coroutine based access to Nexus.
+
+    Arguments:
+        max_workers -- the maximal number of requests which are executed concurrently
+        nexus_client -- an already configured NexusClient to wrap (the connection arguments are ignored in this case)
+    """
+
+    def __init__(self, scheme=None, host=None, prefix=None, alternative_namespace=None, auth_client=None, max_workers=32,
+                 nexus_client=None):
+        if nexus_client is None:
+            nexus_client = NexusClient(scheme, host, prefix, alternative_namespace, auth_client)
+        self._client = nexus_client
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.config = nexus_client.config
+        self.namespace = nexus_client.namespace
+        self.domains = AsyncDomainRepository(nexus_client.domains, self._executor)
+        self.contexts = AsyncContextRepository(nexus_client.contexts, self._executor)
+        self.organizations = AsyncOrganizationRepository(nexus_client.organizations, self._executor)
+        self.instances = AsyncInstanceRepository(nexus_client.instances, self._executor)
+        self.schemas = AsyncSchemaRepository(nexus_client.schemas, self._executor)
+
+    @property
+    def version(self):
+        return self._client.version
+
+    @property
+    def env(self):
+        return self._client.env
+
+    async def version_check(self, supported_versions=NexusClient.SUPPORTED_VERSIONS):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, self._client.version_check, supported_versions)
+
+    def get_fullpath_for_entity(self, entity):
+        return self._client.get_fullpath_for_entity(entity)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        self.close()
@@ -26,24 +26,58 @@ from openid_http_client.http_client import HttpClient
 
 from pyxus.resources.constants import ENV_VAR_NEXUS_ENDPOINT, ENV_VAR_NEXUS_PREFIX, ENV_VAR_NEXUS_NAMESPACE
 from pyxus.resources.repository import DomainRepository, OrganizationRepository, InstanceRepository, SchemaRepository, ContextRepository
+from pyxus.resources.revision_table import RevisionTable
+from pyxus.utils.conditional_http_client import ConditionalHttpClient
+from pyxus.utils.http_trace import RecordingHttpClient, ReplayHttpClient, TraceWriter
+from pyxus.utils.scheduled_http_client import ScheduledHttpClient
 
 
 class NexusClient(object):
     SUPPORTED_VERSIONS = ('0.9.5', '0.9.8')
 
-    def __init__(self, scheme=None, host=None, prefix=None, alternative_namespace=None, auth_client=None):
+    def __init__(self, scheme=None, host=None, prefix=None, alternative_namespace=None, auth_client=None, lazy_refresh=False,
+                 track_revisions=False, read_cache=None, conditional_requests=False, read_budget=None, write_budget=None,
+                 metrics=None, record_trace=None, replay_trace=None):
         self.version = None
         self.logger = logging.getLogger(__name__)
         self.namespace = alternative_namespace if alternative_namespace is not None else "{}://{}".format(scheme, host)
         self.env = None
         self.config = NexusConfig(scheme, host, prefix, alternative_namespace)
-        self._http_client = HttpClient(self.config.NEXUS_ENDPOINT, self.config.NEXUS_PREFIX, auth_client=auth_client,
-                                       alternative_endpoint_writing=self.config.NEXUS_NAMESPACE)
-        self.domains = DomainRepository(self._http_client)
-        self.contexts = ContextRepository(self._http_client)
-        self.organizations = OrganizationRepository(self._http_client)
-        self.instances = InstanceRepository(self._http_client)
-        self.schemas = SchemaRepository(self._http_client)
+        if conditional_requests:
+            self._http_client = conditional_http_client = ConditionalHttpClient(
+                HttpClient(self.config.NEXUS_ENDPOINT, self.config.NEXUS_PREFIX, auth_client=auth_client, raw=True,
+                           alternative_endpoint_writing=self.config.NEXUS_NAMESPACE))
+        else:
+            self._http_client = HttpClient(self.config.NEXUS_ENDPOINT, self.config.NEXUS_PREFIX, auth_client=auth_client,
+                                           alternative_endpoint_writing=self.config.NEXUS_NAMESPACE)
+        if read_budget is not None or write_budget is not None:
+            self._http_client = ScheduledHttpClient(self._http_client, read_budget, write_budget)
+        if replay_trace is not None:
+            # no request reaches Nexus - the responses of the trace are served instead
+            self._http_client = replay_trace if isinstance(replay_trace, ReplayHttpClient) else ReplayHttpClient(replay_trace)
+        self.trace = None
+        if record_trace is not None:
+            self.trace = record_trace if isinstance(record_trace, TraceWriter) else TraceWriter(record_trace)
+            self._http_client = RecordingHttpClient(self._http_client, self.trace)
+        self.revision_table = RevisionTable() if track_revisions else None
+        self.read_cache = read_cache
+        self.metrics = metrics
+        if metrics is not None:
+            if read_cache is not None:
+                metrics.register_cache("read_cache", read_cache)
+            if conditional_requests:
+                metrics.register_cache("conditional_requests", conditional_http_client)
+        repository_options = {
+            "lazy_refresh": lazy_refresh,
+            "revision_table": self.revision_table,
+            "read_cache": read_cache,
+            "metrics": metrics
+        }
+        self.domains = DomainRepository(self._http_client, **repository_options)
+        self.contexts = ContextRepository(self._http_client, **repository_options)
+        self.organizations = OrganizationRepository(self._http_client, **repository_options)
+        self.instances = InstanceRepository(self._http_client, **repository_options)
+        self.schemas = SchemaRepository(self._http_client, **repository_options)
 
     def version_check(self, supported_versions=SUPPORTED_VERSIONS):
         server_metadata_url = '{}/'.format(self.config.NEXUS_ENDPOINT)
@@ -24,28 +24,138 @@ import hashlib
 import json
 import os
 import re
+import threading
+import time
+from collections import OrderedDict
 from pyld import jsonld
 
 from pyxus.resources.constants import ENV_VAR_HASHCODE_NAMESPACE, ENV_VAR_NEXUS_NAMESPACE
-from pyxus.utils.turtle_schema_transformer import transform_turtle_to_jsonld_schema, transform_turtle_to_jsonld
+from pyxus.utils import fast_expansion
+from pyxus.utils.turtle_schema_transformer import iter_turtle_instances, transform_turtle_to_jsonld_schema
+
+
+class DocumentHasher(object):
+    """Canonical checksums of JSON documents.
+
+    The documents are serialized with sorted keys and without insignificant whitespace, so the checksum does not depend
+    on the order of the keys. If both namespaces are given, the Nexus namespace is replaced by the hashcode namespace
+    before hashing (to get the same checksums for the same data in different environments).
+
+    Arguments:
+        nexus_namespace -- the namespace to be replaced
+        hashcode_namespace -- the namespace it is replaced with
+        algorithm -- any algorithm of hashlib - "blake2b" is considerably faster than the default "md5" (Python 3.6+)
+        max_files -- the maximal number of file checksums kept in memory
+    """
+
+    # the coarsest modification time resolution of common file systems (FAT) in seconds
+    MTIME_RESOLUTION = 2
+
+    def __init__(self, nexus_namespace=None, hashcode_namespace=None, algorithm="md5", max_files=10000):
+        if algorithm not in hashlib.algorithms_available and algorithm not in getattr(hashlib, "algorithms_guaranteed", ()):
+            raise ValueError("Hash algorithm {} is not available".format(algorithm))
+        self.algorithm = algorithm
+        self.namespaces = (nexus_namespace, hashcode_namespace)
+        self._replacement = (nexus_namespace, hashcode_namespace) if nexus_namespace and hashcode_namespace else None
+        self._max_files = max_files
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_environment(cls, algorithm="md5"):
+        return cls(os.getenv(ENV_VAR_NEXUS_NAMESPACE), os.getenv(ENV_VAR_HASHCODE_NAMESPACE), algorithm)
+
+    def canonicalize(self, json_data):
+        data = json.dumps(json_data, sort_keys=True, separators=(",", ":"))
+        if self._replacement is not None:
+            data = data.replace(*self._replacement)
+        return data.encode("utf-8")
+
+    def checksum(self, json_data):
+        return self.digest(self.canonicalize(json_data))
+
+    def digest(self, data):
+        if self.algorithm == "blake2b":
+            # 128 bit - as long as the md5 hashcodes
+            return hashlib.blake2b(data, digest_size=16).hexdigest()
+        return hashlib.new(self.algorithm, data).hexdigest()
+
+    def checksum_file(self, file_path):
+        """The checksum of the raw content of a file - memoized as long as the inode, size and modification time do not change
+
+        Files modified less than MTIME_RESOLUTION seconds before they are hashed are not memoized: on file systems with a
+        coarse modification time, a subsequent edit of the same size could otherwise keep the modification time as well.
+        """
+        file_path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        version = (stat.st_ino, stat.st_size, getattr(stat, "st_mtime_ns", stat.st_mtime))
+        with self._lock:
+            cached = self._files.get(file_path)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+        hashed_at = time.time()
+        with open(file_path, "rb") as f:
+            checksum = self.digest(f.read())
+        if hashed_at - stat.st_mtime < self.MTIME_RESOLUTION:
+            return checksum
+        with self._lock:
+            self._files.pop(file_path, None)
+            self._files[file_path] = (version, checksum)
+            while len(self._files) > self._max_files:
+                self._files.popitem(last=False)
+        return checksum
 
 
 class Entity(object):
+    # the DocumentHasher of the checksums - derived from the environment at the time of hashing if None
+    hasher = None
+    _environment_hasher = None
+    # the JSON-LD document loader used by fully_qualify (see CachingDocumentLoader) - pyld's default if None
+    document_loader = None
 
     def __init__(self, identifier, data, root_path):
         self.id = identifier
-        self.data = data
+        self._data = data
+        self._loader = None
+        self._stale_revision = None
         self.root_path = root_path
         self.path = None
         self.build_path()
 
+    @property
+    def data(self):
+        if self._loader is not None:
+            # the entity stays stale if the refresh fails - the next access retries it
+            self._data = self._loader()
+            self._loader = None
+            self._stale_revision = None
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._loader = None
+        self._stale_revision = None
+        self._data = data
+
+    def mark_stale(self, revision, loader):
+        """Records the revision of a write - the document itself is only reloaded by the loader once the data is accessed"""
+        self._stale_revision = revision
+        self._loader = loader
+
+    def is_stale(self):
+        return self._loader is not None
+
     def build_path(self):
         self.path = "{}/{}".format(self.root_path, self.id)
 
     @staticmethod
     def fully_qualify(data):
-        data = jsonld.expand(data)
-        data = jsonld.compact(data, {})
+        fast_result = fast_expansion.fully_qualify(data)
+        if fast_result is not None:
+            return fast_result
+        options = {"documentLoader": Entity.document_loader} if Entity.document_loader is not None else None
+        data = jsonld.expand(data, options)
+        data = jsonld.compact(data, {}, options)
         return data
 
     def to_json(self):
@@ -56,12 +166,19 @@ class Entity(object):
 
     @staticmethod
     def do_get_checksum(json_data):
-        hashcode_base = os.getenv(ENV_VAR_HASHCODE_NAMESPACE)
-        nexus_base = os.getenv(ENV_VAR_NEXUS_NAMESPACE)
-        data = json.dumps(json_data).encode("utf-8")
-        if hashcode_base and nexus_base:
-            data = data.replace(nexus_base, hashcode_base)
-        return hashlib.md5(data).hexdigest()
+        """The canonical checksum of the data - see DocumentHasher (configurable by assigning Entity.hasher)"""
+        return Entity.get_hasher().checksum(json_data)
+
+    @staticmethod
+    def get_hasher():
+        if Entity.hasher is not None:
+            return Entity.hasher
+        namespaces = (os.getenv(ENV_VAR_NEXUS_NAMESPACE), os.getenv(ENV_VAR_HASHCODE_NAMESPACE))
+        hasher = Entity._environment_hasher
+        if hasher is None or hasher.namespaces != namespaces:
+            # rebuilt only if the environment changed - the memoized file checksums survive otherwise
+            hasher = Entity._environment_hasher = DocumentHasher(*namespaces)
+        return hasher
 
     def get_simplified_data(self):
         return self._get_simplified_data(self.data)
@@ -90,6 +207,8 @@ class Entity(object):
         return simple
 
     def get_revision(self):
+        if self._loader is not None:
+            return self._stale_revision
         return self.data["nxv:rev"] if "nxv:rev" in self.data else None
 
     def __str__(self):
@@ -145,6 +264,9 @@ class Entity(object):
         return None
 
     def get_self_link(self):
+        if self._loader is not None and self._data is not None and "@id" in self._data:
+            # the @id of the write response is the one of every revision - no need to reload a stale document for it
+            return self._data["@id"]
         return self.data["@id"]
 
 class Organization(Entity):
@@ -206,14 +328,21 @@ class Instance(Entity):
     @classmethod
     def create_new(cls, organization, domain, schema, version, content, is_turtle=False):
         if is_turtle:
-            content = transform_turtle_to_jsonld(content)
-            if isinstance(content, list) and len(content) == 1:
+            content = list(iter_turtle_instances(content))
+            if len(content) == 1:
                 content = content[0]
             else:
-                raise ValueError("Can't handle multiple instances in same file!")
+                raise ValueError("Can't handle multiple instances in same file! Use Instance.iter_from_turtle instead.")
         identifier = Instance.create_id(organization, domain, schema, version)
         return Instance(identifier, content, Instance.path)
 
+    @classmethod
+    def iter_from_turtle(cls, organization, domain, schema, version, turtle):
+        """Lazily yields a new instance for every subject of a turtle document (see iter_turtle_instances)"""
+        identifier = Instance.create_id(organization, domain, schema, version)
+        for content in iter_turtle_instances(turtle):
+            yield Instance(identifier, content, Instance.path)
+
 
 class Context(Entity):
     path = "/contexts"
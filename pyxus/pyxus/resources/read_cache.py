@@ -0,0 +1,96 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+
+
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+
+class ReadCache(object):
+    """Thread-safe, size bounded LRU cache for the documents read by the repositories.
+
+    A document read at a specific revision is immutable and therefore never expires. A document read without revision
+    (the latest one) expires after latest_ttl seconds and is invalidated by the writes executed through pyxus.
+    Documents are copied on their way in and out, so callers can safely modify what they get.
+    """
+
+    def __init__(self, max_size=1000, latest_ttl=5, clock=time.time):
+        self.max_size = max_size
+        self.latest_ttl = latest_ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, revision=None):
+        key = (path, revision)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and revision is None and entry[1] < self._clock():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            # move to the end - the first entry is always the least recently used one
+            del self._entries[key]
+            self._entries[key] = entry
+            document = entry[0]
+        return copy.deepcopy(document)
+
+    def put(self, path, revision, document):
+        if document is None:
+            return
+        document = copy.deepcopy(document)
+        expires = self._clock() + self.latest_ttl if revision is None else None
+        key = (path, revision)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (document, expires)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, path):
+        """Drops the latest revision of the document - the documents of specific revisions stay valid"""
+        with self._lock:
+            self._entries.pop((path, None), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "hit_ratio": float(self.hits) / total if total else 0.0
+            }
@@ -21,12 +21,22 @@
 
 
 
+import functools
 import logging
 import re
 import codecs
 
 from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.exceptions import HTTPError
+
 from pyxus.resources.entity import Context, Domain, Entity, Instance, Organization, SearchResult, SearchResultList, Schema
+from pyxus.utils.metrics import instrumented
+
+
+def _sent_entity(args):
+    return args[1].data
 
 
 if hasattr(str, "decode"):  # Python 2
@@ -37,59 +47,173 @@ else:                       # Python 3
         return codecs.getdecoder('unicode_escape')(s)[0]
 
 
+class ResolveAllError(Exception):
+    """Exception raised if some of the search results could not be resolved
+
+    Attributes:
+    results -- the resolved entities in the order of the search results (None for the failed ones)
+    errors -- the exceptions of the failed resolutions by the index of their search result
+    """
+    def __init__(self, results, errors):
+        super(ResolveAllError, self).__init__("{} of {} search results could not be resolved".format(len(errors), len(results)))
+        self.results = results
+        self.errors = errors
+
+
+class IncompleteListingError(Exception):
+    """Exception raised if the pages of a listing do not add up to its total
+
+    Attributes:
+    results -- the results which could be loaded
+    total -- the total number of results reported by the first page
+    """
+    def __init__(self, results, total):
+        super(IncompleteListingError, self).__init__("Only {} of {} results could be listed".format(len(results), total))
+        self.results = results
+        self.total = total
+
+
 class Repository(object):
 
-    def __init__(self, http_client, constructor):
+    def __init__(self, http_client, constructor, lazy_refresh=False, revision_table=None, read_cache=None, metrics=None):
+        """
+        Arguments:
+            lazy_refresh -- if True, the entities are not re-read after a write. They only record the new revision and
+                            load their document once their data is accessed.
+            revision_table -- a RevisionTable filled by all reads, writes and listings. Writes without an explicit
+                              revision use the known revision optimistically instead of reading the document first.
+            read_cache -- a ReadCache (or any object providing get, put and invalidate) for the documents read by id
+            metrics -- Metrics recording the latency, the size and the failures of the operations of this repository
+        """
         self.logger = logging.getLogger(__name__)
         self.path = constructor.path
         self._http_client = http_client
         self.constructor = constructor
-
+        self._lazy_refresh = lazy_refresh
+        self._revision_table = revision_table
+        self._read_cache = read_cache
+        self._metrics = metrics
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """Registers a callable which is notified with (operation, entity) after every successful create, update,
+        delete and publish executed by this repository"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """Unregisters a listener - listeners which are not registered (anymore) are ignored"""
+        try:
+            self._listeners.remove(listener)
+        except ValueError:
+            pass
+
+    def _notify(self, operation, entity):
+        for listener in list(self._listeners):
+            try:
+                listener(operation, entity)
+            except Exception:
+                # the write itself was successful - a failing listener must not make it look failed
+                self.logger.exception("Listener %s failed on %s of %s", listener, operation, entity.path)
+
+    @instrumented("create", sent=_sent_entity)
     def create(self, entity):
         self.logger.debug("Creating entity: %s", entity)
         result = self._http_client.put(entity.path, entity.data)
         if result is not None:
             self.logger.info("%s created: %s", entity.__class__.__name__, entity.path)
+            self._record_revision(entity.id, result.get("nxv:rev"))
+            self._invalidate_cache(entity.id)
         entity.data = result
+        if result is not None:
+            self._notify("create", entity)
         return entity
 
+    @instrumented("update", sent=_sent_entity)
     def update(self, entity):
         self.logger.debug("Updating entity: %s", entity)
-        revision = entity.get_revision()
-        if revision is None:
-            revision = self._get_last_revision(entity.id)
-        path = "{}?rev={}".format(entity.path, revision)
-        result = self._http_client.put(path, entity.data)
+        result = self._write_with_revision(entity.id, entity.get_revision(),
+                                           lambda rev: self._http_client.put("{}?rev={}".format(entity.path, rev), entity.data))
         if result is not None:
             new_revision = result["nxv:rev"]
             self.logger.info("%s updated: %s", entity.__class__.__name__, entity.path)
-            entity.data = self._read(entity.id, new_revision)
+            self._refresh(entity, new_revision)
+            self._notify("update", entity)
         return entity
 
+    @instrumented("delete")
     def delete(self, entity, revision=None):
         self.logger.debug("Deleting entity: %s", entity)
-        if revision is None:
-            revision = self._get_last_revision(entity.id)
         if not entity.is_deprecated():
-            path = "{}?rev={}".format(entity.path, revision)
-            result = self._http_client.delete(path)
+            result = self._write_with_revision(entity.id, revision,
+                                               lambda rev: self._http_client.delete("{}?rev={}".format(entity.path, rev)))
             if result is not None:
                 self.logger.info("%s removed: %s", entity.__class__.__name__, entity.path)
                 new_revision = result["nxv:rev"]
-                entity.data = self._read(entity.id, new_revision)
+                self._refresh(entity, new_revision)
+                self._notify("delete", entity)
         return entity
 
+    def _write_with_revision(self, identifier, revision, write):
+        """Executes the write with the given revision.
+
+        If no revision is given, the one of the revision table is used optimistically. If the server rejects it as
+        outdated (409), the last revision is read and the write is retried once.
+        """
+        if revision is not None:
+            return write(revision)
+        known_revision = self._revision_table.get(self._revision_key(identifier)) if self._revision_table is not None else None
+        if known_revision is None:
+            return write(self._get_last_revision(identifier))
+        try:
+            return write(known_revision)
+        except HTTPError as e:
+            if e.response is None or e.response.status_code != 409:
+                raise
+            self.logger.debug("Revision %s of %s is outdated - retrying with the last revision", known_revision, identifier)
+            if self._revision_table is not None:
+                self._revision_table.remove(self._revision_key(identifier))
+            # the cached document is as outdated as the tracked revision
+            self._invalidate_cache(identifier)
+            return write(self._get_last_revision(identifier))
+
+    def _revision_key(self, identifier):
+        return "{}/{}".format(self.path, identifier)
+
+    def _record_revision(self, identifier, revision):
+        if self._revision_table is not None and revision is not None:
+            self._revision_table.record(self._revision_key(identifier), revision)
+
+    def _invalidate_cache(self, identifier):
+        if self._read_cache is not None:
+            self._read_cache.invalidate(self._revision_key(identifier))
+
+    def _refresh(self, entity, revision):
+        self._record_revision(entity.id, revision)
+        self._invalidate_cache(entity.id)
+        if self._lazy_refresh:
+            entity.mark_stale(revision, functools.partial(self._read, entity.id, revision))
+        else:
+            entity.data = self._read(entity.id, revision)
+
+    @instrumented("read", received=lambda result: result)
     def _read(self, identifier, revision=None):
         if revision is None:
             path = "{}/{}".format(self.path, identifier)
         else:
             path = "{}/{}?rev={}".format(self.path, identifier, revision)
-        # try:
-        return self._http_client.get(path)
-        # except HTTPError as e:
-        #     if e.response.status_code==401:
-        #         return None
-        #     raise e
+        result = self._read_cache.get(self._revision_key(identifier), revision) if self._read_cache is not None else None
+        if result is None:
+            # try:
+            result = self._http_client.get(path)
+            # except HTTPError as e:
+            #     if e.response.status_code==401:
+            #         return None
+            #     raise e
+            if self._read_cache is not None:
+                self._read_cache.put(self._revision_key(identifier), revision, result)
+        if revision is None and isinstance(result, dict):
+            self._record_revision(identifier, result.get("nxv:rev"))
+        return result
 
     def _wrap_with_entity(self, search_result):
         identifier = Entity.extract_id_from_url(search_result.self_link, self.path)
@@ -97,6 +221,17 @@ class Repository(object):
             return self.constructor(identifier, search_result.data["source"], self.path)
         return None
 
+    def _to_search_result_list(self, result, resolved):
+        results = [SearchResult(r) for r in result["results"]]
+        if self._revision_table is not None:
+            for search_result in results:
+                if "nxv:rev" in search_result.data["source"]:
+                    identifier = Entity.extract_id_from_url(search_result.self_link, self.path)
+                    self._record_revision(identifier, search_result.data["source"]["nxv:rev"])
+        if resolved:
+            results = [self._wrap_with_entity(r) for r in results]
+        return SearchResultList(result["total"], results, result["links"])
+
     def list_by_full_subpath(self, subpath, resolved=False, deprecated=False):
         if not subpath.startswith('/'):
             subpath = u"/{}".format(subpath)
@@ -106,6 +241,7 @@ class Repository(object):
             path = "{path}{subpath}".format(path=self.path, subpath=subpath or '')
         return self.list_by_full_path(path, deprecated)
 
+    @instrumented("list")
     def list_by_full_path(self, path, deprecated=False):
         path = decode_escapes(path)
         resolved = "fields=all" in path
@@ -113,10 +249,7 @@ class Repository(object):
         path = "{path}&{deprecated}".format(path=path, deprecated=deprecated) if '?' in path else "{path}?{deprecated}".format(path=path, deprecated=deprecated)
         result = self._http_client.get(path)
         if result is not None:
-            results = [SearchResult(r) for r in result["results"]]
-            if resolved:
-                results = [self._wrap_with_entity(r) for r in results]
-            return SearchResultList(result["total"], results, result["links"])
+            return self._to_search_result_list(result, resolved)
         return None
 
     def list(self, resolved=False, subpath=None, full_text_query=None, filter_query=None, from_index=None, size=None, deprecated=False, context=None):
@@ -131,14 +264,113 @@ class Repository(object):
         )
         return self.list_by_full_subpath(subpath, resolved)
 
+    def iter(self, subpath=None, resolved=False, full_text_query=None, filter_query=None, size=None, deprecated=False, context=None,
+             prefetch=True):
+        """Lazily iterate over all results of a listing by following the pagination links.
+
+        Arguments:
+            size -- the number of results requested per page
+            prefetch -- if True, the next page is loaded in the background while the current one is consumed.
+                        Not more than two pages are held in memory at any time.
+        """
+        page = self.list(resolved=resolved, subpath=subpath, full_text_query=full_text_query, filter_query=filter_query,
+                         size=size, deprecated=deprecated, context=context)
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            while page is not None and page.results:
+                next_link = page.get_next_link()
+                next_page = None
+                if next_link is not None and executor is not None:
+                    # the deprecation filter is already part of the next link
+                    next_page = executor.submit(self.list_by_full_path, next_link, None)
+                for result in page.results:
+                    yield result
+                if next_link is None:
+                    break
+                page = next_page.result() if next_page is not None else self.list_by_full_path(next_link, None)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def list_all(self, resolved=False, subpath=None, full_text_query=None, filter_query=None, size=100, deprecated=False, context=None,
+                 max_workers=4):
+        """Load all results of a listing by requesting the remaining pages concurrently.
+
+        The first page reveals the total number of results as well as the page size applied by the server (which might
+        be smaller than the requested size), the other pages are then requested in parallel by their offset. Pages
+        returning less than expected are completed sequentially. The results are returned in the order of the listing
+        as one SearchResultList - an IncompleteListingError is raised if they do not add up to the total.
+
+        Arguments:
+            size -- the number of results requested per page
+            max_workers -- the maximal number of pages requested concurrently
+        """
+        def load_page(from_index):
+            return self.list(resolved=resolved, subpath=subpath, full_text_query=full_text_query, filter_query=filter_query,
+                             from_index=from_index, size=size, deprecated=deprecated, context=context)
+
+        first_page = load_page(0)
+        if first_page is None:
+            return None
+        results = list(first_page.results)
+        page_size = len(first_page.results)
+        offsets = range(page_size, first_page.total, page_size) if page_size else []
+        if offsets:
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+            try:
+                for offset, page in zip(offsets, executor.map(load_page, offsets)):
+                    window = list(page.results) if page is not None else []
+                    expected = min(page_size, first_page.total - offset)
+                    while len(window) < expected:
+                        gap = load_page(offset + len(window))
+                        if gap is None or not gap.results:
+                            break
+                        window.extend(gap.results[:expected - len(window)])
+                    results.extend(window)
+            finally:
+                executor.shutdown(wait=True)
+        if len(results) != first_page.total:
+            raise IncompleteListingError(results, first_page.total)
+        links = dict((k, v) for k, v in first_page.links.items() if k not in ("next", "previous"))
+        return SearchResultList(first_page.total, results, links)
+
     def _get_last_revision(self, identifier):
         current_revision = self._read(identifier)
         if current_revision is not None and "nxv:rev" in current_revision:
             return current_revision.get("nxv:rev") or 0
         return 0
 
-    def resolve_all(self, search_result_list):
-        return [self.resolve(search_result) for search_result in search_result_list.results]
+    def resolve_all(self, search_result_list, max_workers=1):
+        """Resolve all search results of the list.
+
+        The resolved entities are returned in the order of the search results. A failing resolution does not abort
+        the others - all failures are collected and raised as one ResolveAllError once the batch is completed.
+
+        Arguments:
+            max_workers -- the maximal number of resolutions executed concurrently
+        """
+        search_results = search_result_list.results
+        results = [None] * len(search_results)
+        errors = {}
+
+        def resolve(index):
+            try:
+                results[index] = self.resolve(search_results[index])
+            except Exception as e:  # pylint: disable=broad-except
+                errors[index] = e
+
+        if max_workers > 1 and len(search_results) > 1:
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+            try:
+                list(executor.map(resolve, range(len(search_results))))
+            finally:
+                executor.shutdown(wait=True)
+        else:
+            for index in range(len(search_results)):
+                resolve(index)
+        if errors:
+            raise ResolveAllError(results, errors)
+        return results
 
     def find_by_identifier(self, subpath, value, resolved=False, deprecated=False):
         return self.find_by_field(subpath, "http://schema.org/identifier", value, resolved=resolved, deprecated=deprecated)
@@ -157,10 +389,7 @@ class Repository(object):
             path += "&fields=all"
         result = self._http_client.get(path)
         if result is not None:
-            results = [SearchResult(r) for r in result["results"]]
-            if resolved:
-                results = [self._wrap_with_entity(r) for r in results]
-            return SearchResultList(result["total"], results, result["links"])
+            return self._to_search_result_list(result, resolved)
         return None
 
     def fulltext_search(self, value, subpath=None, resolved=False, deprecated=False):
@@ -178,10 +407,7 @@ class Repository(object):
             path += "&fields=all"
         result = self._http_client.get(path)
         if result is not None:
-            results = [SearchResult(r) for r in result["results"]]
-            if resolved:
-                results = [self._wrap_with_entity(r) for r in results]
-            return SearchResultList(result["total"], results, result["links"])
+            return self._to_search_result_list(result, resolved)
         return None
 
     @abstractmethod
@@ -191,8 +417,8 @@ class Repository(object):
 
 class OrganizationRepository(Repository):
 
-    def __init__(self, http_client):
-        super(OrganizationRepository, self).__init__(http_client, Organization)
+    def __init__(self, http_client, **kwargs):
+        super(OrganizationRepository, self).__init__(http_client, Organization, **kwargs)
 
     def read(self, name, revision=None):
         data = self._read(name, revision)
@@ -206,8 +432,8 @@ class OrganizationRepository(Repository):
 
 class DomainRepository(Repository):
 
-    def __init__(self, http_client):
-        super(DomainRepository, self).__init__(http_client, Domain)
+    def __init__(self, http_client, **kwargs):
+        super(DomainRepository, self).__init__(http_client, Domain, **kwargs)
 
     def read(self, organization, domain, revision=None):
         identifier = Domain.create_id(organization, domain)
@@ -222,24 +448,25 @@ class DomainRepository(Repository):
 
 class SchemaRepository(Repository):
 
-    def __init__(self, http_client):
-        super(SchemaRepository, self).__init__(http_client, Schema)
+    def __init__(self, http_client, **kwargs):
+        super(SchemaRepository, self).__init__(http_client, Schema, **kwargs)
 
     def read(self, organization, domain, schema, version, revision=None):
         identifier = Schema.create_id(organization, domain, schema, version)
         data = self._read(identifier, revision)
         return Schema(identifier, data, self.path) if data is not None else None
 
+    @instrumented("publish")
     def publish(self, entity, publish, revision=None):
-        if revision is None:
-            revision = self._get_last_revision(entity.id)
-        path = "{}/config?rev={}".format(entity.path, revision)
-        result = self._http_client.patch(path, {
-            'published': publish
-        })
+        def patch(rev):
+            return self._http_client.patch("{}/config?rev={}".format(entity.path, rev), {
+                'published': publish
+            })
+        result = self._write_with_revision(entity.id, revision, patch)
         if result is not None:
             new_revision = result["nxv:rev"]
-            entity.data = self._read(entity.id, new_revision)
+            self._refresh(entity, new_revision)
+            self._notify("publish", entity)
         return entity
 
     def resolve(self, search_result):
@@ -250,9 +477,10 @@ class SchemaRepository(Repository):
 
 class InstanceRepository(Repository):
 
-    def __init__(self, http_client):
-        super(InstanceRepository, self).__init__(http_client, Instance)
+    def __init__(self, http_client, **kwargs):
+        super(InstanceRepository, self).__init__(http_client, Instance, **kwargs)
 
+    @instrumented("create", sent=_sent_entity)
     def create(self, entity):
         result = self._http_client.post(entity.path, entity.data)
         if result is None:
@@ -262,6 +490,9 @@ class InstanceRepository(Repository):
         entity.data = result
         entity.id = Instance.extract_id_from_url(result.get("@id"), self.path)
         entity.build_path()
+        self._record_revision(entity.id, result.get("nxv:rev"))
+        self._invalidate_cache(entity.id)
+        self._notify("create", entity)
         return entity
 
     @staticmethod
@@ -295,24 +526,25 @@ class InstanceRepository(Repository):
 
 class ContextRepository(Repository):
 
-    def __init__(self, http_client):
-        super(ContextRepository, self).__init__(http_client, Context)
+    def __init__(self, http_client, **kwargs):
+        super(ContextRepository, self).__init__(http_client, Context, **kwargs)
 
     def read(self, organization, domain, context, version, revision=None):
         identifier = Context.create_id(organization, domain, context, version)
         data = self._read(identifier, revision)
         return Context(identifier, data, self.path) if data is not None else None
 
+    @instrumented("publish")
     def publish(self, entity, publish, revision=None):
-        if revision is None:
-            revision = self._get_last_revision(entity.id)
-        path = "{}/config?rev={}".format(entity.path, revision)
-        result = self._http_client.patch(path, {
-            'published': publish
-        })
+        def patch(rev):
+            return self._http_client.patch("{}/config?rev={}".format(entity.path, rev), {
+                'published': publish
+            })
+        result = self._write_with_revision(entity.id, revision, patch)
         if result is not None:
             new_revision = result["nxv:rev"]
-            entity.data = self._read(entity.id, new_revision)
+            self._refresh(entity, new_revision)
+            self._notify("publish", entity)
         return entity
 
     def resolve(self, search_result):
@@ -0,0 +1,55 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+
+
+import threading
+
+
+class RevisionTable(object):
+    """Thread-safe table of the last known revisions of the entities by their path (e.g. /schemas/org/domain/schema/v1.0.0)"""
+
+    def __init__(self):
+        self._revisions = {}
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        with self._lock:
+            return self._revisions.get(path)
+
+    def record(self, path, revision):
+        """Records an observed revision - older revisions than the already known one are ignored"""
+        if revision is None:
+            return
+        with self._lock:
+            known = self._revisions.get(path)
+            if known is None or revision > known:
+                self._revisions[path] = revision
+
+    def remove(self, path):
+        with self._lock:
+            self._revisions.pop(path, None)
+
+    def clear(self):
+        with self._lock:
+            self._revisions.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._revisions)
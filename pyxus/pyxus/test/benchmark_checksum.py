@@ -0,0 +1,59 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+#
+#
+
+"""Micro-benchmark of the document checksums: python -m pyxus.test.benchmark_checksum"""
+
+import hashlib
+import json
+import timeit
+
+from pyxus.resources.entity import DocumentHasher
+
+
+def _document(size):
+    return {
+        "@context": {"schema": "http://schema.org/", "nsg": "https://bbp-nexus.epfl.ch/vocabs/bbp/neurosciencegraph/core/v0.1.0/"},
+        "@type": ["nsg:Dataset"],
+        "schema:identifier": "dataset",
+        "nsg:parts": [{"@id": "https://nexus.example.org/v0/data/test/core/part/v0.0.1/{}".format(index),
+                       "schema:name": "part {}".format(index), "nsg:size": index} for index in range(size)]
+    }
+
+
+def _legacy_checksum(json_data):
+    return hashlib.md5(json.dumps(json_data).encode("utf-8")).hexdigest()
+
+
+def main(number=2000):
+    hashers = [("legacy md5", _legacy_checksum), ("canonical md5", DocumentHasher().checksum)]
+    if "blake2b" in hashlib.algorithms_available:
+        hashers.append(("canonical blake2b", DocumentHasher(algorithm="blake2b").checksum))
+    hashers.append(("canonical md5 with namespace", DocumentHasher("https://nexus.example.org", "https://hashcode.example.org").checksum))
+    for size in (10, 100, 1000):
+        document = _document(size)
+        for name, checksum in hashers:
+            duration = timeit.timeit(lambda: checksum(document), number=number)
+            print("{:>5} parts {:<30} {:8.1f} us".format(size, name, duration / number * 1e6))
+
+
+if __name__ == "__main__":
+    main()
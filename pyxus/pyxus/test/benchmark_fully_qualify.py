@@ -0,0 +1,63 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+#
+#
+
+"""Benchmark of the full qualification with and without fast path: python -m pyxus.test.benchmark_fully_qualify"""
+
+import timeit
+
+from pyld import jsonld
+
+from pyxus.resources.entity import Entity
+
+CONTEXT = {"schema": "http://schema.org/", "nsg": "https://bbp-nexus.epfl.ch/vocabs/bbp/neurosciencegraph/core/v0.1.0/",
+           "prov": "http://www.w3.org/ns/prov#"}
+
+
+def _prefixed(size):
+    return {
+        "@context": CONTEXT,
+        "@type": ["nsg:Dataset", "prov:Entity"],
+        "schema:identifier": "dataset",
+        "schema:name": "Dataset",
+        "nsg:parts": [{"@id": "https://nexus.example.org/v0/data/test/core/part/v0.0.1/{}".format(index),
+                       "schema:name": "part {}".format(index), "nsg:size": index} for index in range(size)]
+    }
+
+
+def _pyld(data):
+    return jsonld.compact(jsonld.expand(data), {})
+
+
+def main(number=200):
+    for size in (1, 10, 100):
+        prefixed = _prefixed(size)
+        documents = [("prefix-only context", prefixed), ("fully qualified", _pyld(prefixed))]
+        for name, document in documents:
+            assert Entity.fully_qualify(document) == _pyld(document)
+            full = timeit.timeit(lambda: _pyld(document), number=number) / number
+            fast = timeit.timeit(lambda: Entity.fully_qualify(document), number=number) / number
+            print("{:>4} parts {:<20} pyld {:9.1f} us  fast path {:7.1f} us  speedup {:6.1f}x".format(
+                size, name, full * 1e6, fast * 1e6, full / fast))
+
+
+if __name__ == "__main__":
+    main()
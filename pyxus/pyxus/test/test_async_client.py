@@ -0,0 +1,81 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+#
+#
+
+import sys
+import time
+from unittest import TestCase, skipIf
+
+from mock.mock import MagicMock
+
+from pyxus.resources.entity import SearchResultList
+from pyxus.resources.repository import ResolveAllError
+
+# the asyncio front-end uses the async / await syntax of Python 3.5+
+if sys.version_info >= (3, 5):
+    import asyncio
+    from pyxus.async_client import AsyncNexusClient
+
+
+def _run(coroutine):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+@skipIf(sys.version_info < (3, 5), "AsyncNexusClient requires Python 3.5+")
+class TestAsyncNexusClient(TestCase):
+
+    def setUp(self):
+        self.nexus_client = MagicMock()
+        self.client = AsyncNexusClient(nexus_client=self.nexus_client, max_workers=10)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_read_is_delegated(self):
+        self.nexus_client.schemas.read = MagicMock(return_value="schema")
+        result = _run(self.client.schemas.read("org", "domain", "schema", "v1.0.0"))
+        self.assertEqual(result, "schema")
+        self.nexus_client.schemas.read.assert_called_once_with("org", "domain", "schema", "v1.0.0")
+
+    def test_requests_are_executed_concurrently(self):
+        def slow_resolve(search_result):
+            time.sleep(0.2)
+            return search_result
+        self.nexus_client.instances.resolve = MagicMock(side_effect=slow_resolve)
+        search_results = SearchResultList(10, list(range(10)), {})
+        start = time.time()
+        result = _run(self.client.instances.resolve_all(search_results))
+        self.assertEqual(result, list(range(10)))
+        self.assertLess(time.time() - start, 1)
+
+    def test_resolve_all_collects_failures(self):
+        self.nexus_client.instances.resolve = MagicMock(side_effect=lambda r: 1 / r)
+        search_results = SearchResultList(3, [1, 0, 2], {})
+        with self.assertRaises(ResolveAllError) as context:
+            _run(self.client.instances.resolve_all(search_results, max_workers=2))
+        self.assertEqual(context.exception.results, [1, None, 0.5])
+        self.assertIsInstance(context.exception.errors[1], ZeroDivisionError)
@@ -0,0 +1,111 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+#
+#
+
+
+import json
+import re
+from unittest import TestCase
+
+from mock.mock import MagicMock, patch
+
+from pyxus.utils.blazegraph import BlazegraphClient, _iter_json_bindings, _iter_tabular_bindings
+from pyxus.utils.query_cache import QueryCache
+
+BINDINGS = [{"rel": {"type": "uri", "value": "http://nexus/v0/data/a"}},
+            {"rel": {"type": "literal", "value": "b ] }, \"bindings\": ["}, "x": {"type": "literal", "value": "1"}}]
+RESULT = json.dumps({"head": {"vars": ["rel", "x"]}, "results": {"bindings": BINDINGS}}, indent=2)
+
+
+def _chunks(text, size):
+    return iter([text[index:index + size] for index in range(0, len(text), size)])
+
+
+class TestBlazegraphClient(TestCase):
+
+    def test_json_bindings_are_parsed_incrementally(self):
+        for size in (1, 7, len(RESULT)):
+            self.assertEqual(list(_iter_json_bindings(_chunks(RESULT, size))), BINDINGS)
+        self.assertEqual(list(_iter_json_bindings(_chunks('{"head": {}, "results": {"bindings": []}}', 3))), [])
+
+    def test_truncated_json_result(self):
+        self.assertRaises(ValueError, list, _iter_json_bindings(_chunks(RESULT[:-30], 5)))
+
+    def test_tabular_bindings(self):
+        csv_result = 'rel,x\r\nhttp://nexus/v0/data/a,\r\n"multi\nline, value",1\r\n'
+        self.assertEqual(list(_iter_tabular_bindings(_chunks(csv_result, 4), ",")),
+                         [{"rel": "http://nexus/v0/data/a"}, {"rel": "multi\nline, value", "x": "1"}])
+        tsv_result = '?rel\t?x\n<http://nexus/v0/data/a>\t\n"b"\t"1"^^<http://www.w3.org/2001/XMLSchema#integer>\n'
+        self.assertEqual(list(_iter_tabular_bindings(_chunks(tsv_result, 4), "\t")),
+                         [{"rel": "<http://nexus/v0/data/a>"}, {"rel": '"b"', "x": '"1"^^<http://www.w3.org/2001/XMLSchema#integer>'}])
+
+    def test_iter_query(self):
+        response = MagicMock()
+        response.iter_content = MagicMock(return_value=_chunks(RESULT.encode("utf-8"), 10))
+        with patch("pyxus.utils.blazegraph.requests.Session.post", MagicMock(return_value=response)) as post:
+            client = BlazegraphClient("http://blazegraph", "http://nexus")
+            self.assertEqual(list(client.iter_query("SELECT ?rel WHERE {?rel ?p ?o}")), BINDINGS)
+        self.assertTrue(post.call_args[1]["stream"])
+        response.close.assert_called_once_with()
+
+    def test_get_reverse_relations_many(self):
+        def iter_query(query):
+            self.assertIn("VALUES ?uuid", query)
+            uuids = [uuid for uuid in ("a", "b", "c") if '"{}"^^xsd:string'.format(uuid) in query]
+            return [{"uuid": {"value": uuid}, "rel": {"value": "http://nexus/v0/data/rel-" + uuid}} for uuid in uuids if uuid != "b"]
+
+        client = BlazegraphClient("http://blazegraph", "http://nexus")
+        client.iter_query = MagicMock(side_effect=iter_query)
+        relations = client.get_reverse_relations_many(["a", "b", "c", "a"], chunk_size=2, max_workers=2)
+        self.assertEqual(relations, {"a": ["http://nexus/v0/data/rel-a"], "b": [], "c": ["http://nexus/v0/data/rel-c"]})
+        self.assertEqual(client.iter_query.call_count, 2)
+
+    def test_query_cache(self):
+        response = MagicMock()
+        response.status_code = 200
+        response.content = RESULT.encode("utf-8")
+        with patch("pyxus.utils.blazegraph.requests.Session.post", MagicMock(return_value=response)) as post:
+            client = BlazegraphClient("http://blazegraph", "http://nexus", query_cache=QueryCache())
+            self.assertEqual(client.query("SELECT ?rel WHERE {?rel ?p ?o}"), BINDINGS)
+            self.assertEqual(client.query("SELECT ?rel\nWHERE {?rel ?p ?o}"), BINDINGS)
+            self.assertEqual(post.call_count, 1)
+            client.invalidate_cache("update", None)
+            client.query("SELECT ?rel WHERE {?rel ?p ?o}")
+            self.assertEqual(post.call_count, 2)
+
+    def test_iter_query_pages(self):
+        rows = [{"s": {"type": "literal", "value": str(index)}} for index in range(25)]
+
+        def iter_query(query):
+            limit, offset = [int(value) for value in re.search(r"LIMIT (\d+) OFFSET (\d+)$", query).groups()]
+            return iter(rows[offset:offset + limit])
+
+        client = BlazegraphClient("http://blazegraph", "http://nexus")
+        client.iter_query = MagicMock(side_effect=iter_query)
+        self.assertEqual(list(client.iter_query_pages("SELECT ?s WHERE {\n ?s ?p ?o }", page_size=10, max_workers=2)), rows)
+        self.assertTrue(client.iter_query.call_args_list[0][0][0].startswith("SELECT ?s WHERE { ?s ?p ?o } ORDER BY ?s LIMIT 10 OFFSET "))
+
+    def test_ordered_query(self):
+        self.assertEqual(BlazegraphClient._ordered_query("SELECT DISTINCT ?s (COUNT(?o) AS ?count) WHERE { ?s ?p ?o } GROUP BY ?s", None),
+                         "SELECT DISTINCT ?s (COUNT(?o) AS ?count) WHERE { ?s ?p ?o } GROUP BY ?s ORDER BY ?s ?count")
+        self.assertEqual(BlazegraphClient._ordered_query("SELECT * WHERE { ?s ?p ?o } ORDER BY ?o", None), "SELECT * WHERE { ?s ?p ?o } ORDER BY ?o")
+        self.assertRaises(ValueError, BlazegraphClient._ordered_query, "SELECT * WHERE { ?s ?p ?o }", None)
+        self.assertRaises(ValueError, BlazegraphClient._ordered_query, "SELECT ?s WHERE { ?s ?p ?o } LIMIT 10", None)
@@ -0,0 +1,104 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+#
+#
+
+import json
+import threading
+from unittest import TestCase
+
+import requests
+
+from pyxus.utils.conditional_http_client import ConditionalHttpClient
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+
+class _NexusStandIn(BaseHTTPRequestHandler):
+    documents = {}
+    received = []
+
+    def do_GET(self):
+        self.received.append((self.path, self.headers.get("If-None-Match")))
+        document = self.documents.get(self.path)
+        if document is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        etag = '"{}"'.format(document["nxv:rev"])
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps(document).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/ld+json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _RawHttpClient(object):
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+
+    def get(self, url, headers=None):
+        return requests.get(self.endpoint + url, headers=headers)
+
+
+class TestConditionalHttpClient(TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), _NexusStandIn)
+        threading.Thread(target=self.server.serve_forever).start()
+        _NexusStandIn.documents = {"/v0/schemas/org/dom/schema/v1.0.0": {"nxv:rev": 1, "foo": "bar"}}
+        _NexusStandIn.received = []
+        self.client = ConditionalHttpClient(_RawHttpClient("http://127.0.0.1:{}".format(self.server.server_port)))
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_unchanged_document_is_revalidated(self):
+        first = self.client.get("/v0/schemas/org/dom/schema/v1.0.0")
+        second = self.client.get("/v0/schemas/org/dom/schema/v1.0.0")
+        self.assertEqual(first, {"nxv:rev": 1, "foo": "bar"})
+        self.assertEqual(second, first)
+        self.assertEqual(_NexusStandIn.received, [("/v0/schemas/org/dom/schema/v1.0.0", None),
+                                                 ("/v0/schemas/org/dom/schema/v1.0.0", '"1"')])
+        self.assertEqual(self.client.stats()["hits"], 1)
+        self.assertGreater(self.client.stats()["bytes_saved"], 0)
+
+    def test_changed_document_is_transferred(self):
+        self.client.get("/v0/schemas/org/dom/schema/v1.0.0")
+        _NexusStandIn.documents["/v0/schemas/org/dom/schema/v1.0.0"] = {"nxv:rev": 2, "foo": "baz"}
+        self.assertEqual(self.client.get("/v0/schemas/org/dom/schema/v1.0.0"), {"nxv:rev": 2, "foo": "baz"})
+        self.assertEqual(self.client.stats()["hits"], 0)
+
+    def test_missing_document(self):
+        self.assertIsNone(self.client.get("/v0/schemas/org/dom/missing/v1.0.0"))
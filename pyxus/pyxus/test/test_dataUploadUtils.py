@@ -19,12 +19,18 @@
 #  (Human Brain Project SGA1, SGA2 and SGA3).
 #
 
+import copy
 import json
+import os
+import shutil
+import tempfile
 from unittest import TestCase
 
-from mock.mock import MagicMock
+from mock.mock import ANY, MagicMock
 
+from pyxus.resources.entity import Entity, Instance, SearchResultList
 from pyxus.utils.data_upload_utils import DataUploadUtils
+from pyxus.utils.schema_or_context_data import SchemaOrContextData
 
 
 class TestDataUploadUtils(TestCase):
@@ -40,3 +46,251 @@ class TestDataUploadUtils(TestCase):
         expected = {"schema:identifier": "testIdentifier", "test:relationA": {"@id": "foo"}, "test:relationB": {"@id": "foo"}, "@context": {"test": "http://test.org#", "schema": "http://schema.org/"}, "@type": ["test:Test"], "test:xyz": "bar"}
         result = data_upload_utils.resolve_entities(json.dumps(payload), False)
         self.assertEqual(json.dumps(expected), json.dumps(json.loads(result)))
+
+    def test_resolve_content_is_equivalent_to_resolve_entities(self):
+        client = MagicMock()
+        client.config.NEXUS_NAMESPACE = "http://nexus"
+        client.config.NEXUS_PREFIX = "v0"
+        data_upload_utils = DataUploadUtils(client)
+        data_upload_utils.resolve_identifier = MagicMock(side_effect=lambda match: "http://nexus/v0/data/{}".format(abs(hash(match))))
+        payload = {"@context": {"schema": "http://schema.org/", "test": "http://test.org#", "base": "{{base}}/vocab/"},
+                   "@type": ["test:Test"], "schema:identifier": "testIdentifier",
+                   "test:relationA": "{{resolve /test/core/test/v0.0.1/?filter={\"op\":\"eq\",\"path\":\"http://schema.org/identifier\", \"value\":\"bar\"}}}",
+                   "test:relationB": ["{{resolve_by_identifier /test/core/test/v0.0.1/ bar}}"],
+                   "test:nested": {"test:url": "{{base}}/data/{{resolve_id /test/core/test/v0.0.1/?filter={\"value\":\"baz\"}}}"},
+                   "test:xyz": "bar"}
+        expected = json.loads(data_upload_utils._fill_placeholders(data_upload_utils.resolve_entities(json.dumps(payload), False)))
+        legacy_queries = [call[0][0] for call in data_upload_utils.resolve_identifier.call_args_list]
+        data_upload_utils.resolve_identifier.reset_mock()
+        result = data_upload_utils.resolve_content(json.loads(json.dumps(payload)), False)
+        self.assertEqual(result, expected)
+        self.assertEqual(sorted(call[0][0] for call in data_upload_utils.resolve_identifier.call_args_list), sorted(legacy_queries))
+
+    def test_create_schemas_and_contexts_by_directory(self):
+        root = tempfile.mkdtemp()
+        try:
+            files = {
+                "schemas/test/core/a/v0.0.1/a.json": {"@context": "{{base}}/contexts/test/core/ctx/v0.0.1", "shapes": []},
+                "schemas/test/core/b/v0.0.1/b.json": {"imports": ["{{base}}/schemas/test/core/a/v0.0.1"], "shapes": []},
+                "schemas/test/core/c/v0.0.1/c.json": {"shapes": []},
+                "contexts/test/core/ctx/v0.0.1/ctx.json": {"@context": {"schema": "http://schema.org/"}}
+            }
+            for path, content in files.items():
+                os.makedirs(os.path.dirname(os.path.join(root, path)))
+                with open(os.path.join(root, path), "w") as f:
+                    json.dump(content, f)
+            client = MagicMock()
+            client.config.NEXUS_NAMESPACE = "http://nexus"
+            client.config.NEXUS_PREFIX = "v0"
+            data_upload_utils = DataUploadUtils(client)
+            data_upload_utils.create_schema = MagicMock(side_effect=lambda data, *args: data)
+            data_upload_utils.create_context = MagicMock(side_effect=lambda data, *args: data)
+            uploaded = data_upload_utils.create_schemas_and_contexts_by_directory(os.path.join(root, "schemas"), os.path.join(root, "contexts"))
+            self.assertEqual([data.name for data in uploaded], ["ctx", "c", "a", "b"])
+
+            calls = []
+
+            def create(data, *args):
+                calls.append(("upload", data.name))
+                data.revision = 1
+                return data
+            data_upload_utils.create_schema = MagicMock(side_effect=create)
+            data_upload_utils.create_context = MagicMock(side_effect=create)
+            client.schemas.publish = MagicMock(side_effect=lambda entity, *args: calls.append(("publish", entity.id.split("/")[2])))
+            client.contexts.publish = MagicMock(side_effect=lambda entity, *args: calls.append(("publish", entity.id.split("/")[2])))
+            data_upload_utils.create_schemas_and_contexts_by_directory(os.path.join(root, "schemas"), os.path.join(root, "contexts"),
+                                                                       publish=True)
+            # every level is published as a whole before the next level is uploaded
+            self.assertEqual([sorted(calls[:4]), calls[4:6], calls[6:]],
+                             [[("publish", "c"), ("publish", "ctx"), ("upload", "c"), ("upload", "ctx")],
+                              [("upload", "a"), ("publish", "a")], [("upload", "b"), ("publish", "b")]])
+            self.assertEqual([call[0] for call in calls[:4]].index("publish"), 2)
+        finally:
+            shutil.rmtree(root)
+
+    def test_create_instances_in_link_order(self):
+        def instance(identifier, *links):
+            payload = {"@context": {"schema": "http://schema.org/"}, "schema:identifier": identifier}
+            for index, link in enumerate(links):
+                payload["schema:link{}".format(index)] = "{{{{resolve_by_identifier /test/core/test/v0.0.1/ {}}}}}".format(link)
+            return json.dumps(payload), SchemaOrContextData("test", "core", "test", "v0.0.1", None)
+
+        uploaded = []
+
+        def upload_instance(data, schema_data, fail_if_linked_instance_is_missing):
+            identifier = json.loads(data)["schema:identifier"]
+            uploaded.append(identifier)
+            return Instance("test/core/test/v0.0.1/" + identifier, {"@id": "http://nexus/v0/data/test/core/test/v0.0.1/" + identifier}, Instance.path), None
+
+        client = MagicMock()
+        client.instances.iter = MagicMock(return_value=[])
+        data_upload_utils = DataUploadUtils(client)
+        data_upload_utils.upload_instance = MagicMock(side_effect=upload_instance)
+        data_upload_utils.create_instances([instance("c", "a", "b"), instance("b", "a"), instance("a"), instance("d", "unknown")])
+        self.assertEqual(sorted(uploaded[:2]), ["a", "d"])
+        self.assertEqual(uploaded[2:], ["b", "c"])
+        self.assertEqual(data_upload_utils.resolve_identifier(data_upload_utils._identifier_query("test/core/test/v0.0.1", "b")),
+                         "http://nexus/v0/data/test/core/test/v0.0.1/b")
+
+    def test_literal_identifier_filters_use_the_cache_of_the_waves(self):
+        link = '{{resolve /test/core/test/v0.0.1/?filter={"filter": {"path": "http://schema.org/identifier", "value": "a", "op": "eq"}}}}'
+        schema_data = SchemaOrContextData("test", "core", "test", "v0.0.1", None)
+        instances = [(json.dumps({"@context": {"schema": "http://schema.org/"}, "schema:identifier": "b", "schema:link": link}), schema_data),
+                     (json.dumps({"@context": {"schema": "http://schema.org/"}, "schema:identifier": "a"}), schema_data)]
+        client = MagicMock()
+        client.instances.iter = MagicMock(return_value=[])
+        data_upload_utils = DataUploadUtils(client)
+        resolved = []
+
+        def upload_instance(data, schema_data, fail_if_linked_instance_is_missing):
+            content = json.loads(data)
+            if "schema:link" in content:
+                resolved.append(data_upload_utils.resolve_content(content, True)["schema:link"])
+            identifier = content["schema:identifier"]
+            return Instance("test/core/test/v0.0.1/" + identifier, {"@id": "http://nexus/v0/data/test/core/test/v0.0.1/" + identifier}, Instance.path), None
+        data_upload_utils.upload_instance = MagicMock(side_effect=upload_instance)
+        data_upload_utils.create_instances(instances)
+        self.assertEqual(resolved, [{"@id": "http://nexus/v0/data/test/core/test/v0.0.1/a"}])
+        client.instances.list_by_full_subpath.assert_not_called()
+
+    def test_create_instances_accepts_templates(self):
+        template = '{"@context": {"schema": "http://schema.org/"}, "schema:url": {{base}}}'
+        data_upload_utils = DataUploadUtils(MagicMock())
+        data_upload_utils.upload_instance = MagicMock(return_value=(None, None))
+        data_upload_utils.create_instances([(template, SchemaOrContextData("test", "core", "test", "v0.0.1", None))])
+        data_upload_utils.upload_instance.assert_called_once_with(template, ANY, True)
+
+    def test_unchanged_existing_instance_is_skipped_without_requests_on_the_next_run(self):
+        root = tempfile.mkdtemp()
+        try:
+            file_path = os.path.join(root, "test/core/test/v0.0.1/a.json")
+            os.makedirs(os.path.dirname(file_path))
+            content = {"@context": {"schema": "http://schema.org/"}, "schema:identifier": "a"}
+            with open(file_path, "w") as f:
+                json.dump(content, f)
+            existing = Entity.fully_qualify(copy.deepcopy(content))
+            existing.update({"@id": "http://nexus/v0/data/test/core/test/v0.0.1/a", "nxv:rev": 2,
+                             "http://hbp.eu/internal#hashcode": Entity.do_get_checksum(Entity.fully_qualify(copy.deepcopy(content)))})
+            client = MagicMock()
+            client.config.NEXUS_NAMESPACE = "http://nexus"
+            client.config.NEXUS_PREFIX = "v0"
+            client.instances.find_by_field = MagicMock(return_value=SearchResultList(1, [
+                Instance("test/core/test/v0.0.1/a", existing, Instance.path)], {}))
+            DataUploadUtils(client).create_instance_by_file(file_path, use_checksums=True)
+            client.instances.update.assert_not_called()
+            with open(file_path + ".chksum") as f:
+                self.assertEqual(json.load(f)["revision"], 2)
+
+            client.instances.reset_mock()
+            self.assertIsNone(DataUploadUtils(client).create_instance_by_file(file_path, use_checksums=True))
+            self.assertEqual(client.instances.find_by_field.call_count, 0)
+            client.instances.create.assert_not_called()
+        finally:
+            shutil.rmtree(root)
+
+    def test_checksum_manifest_of_a_created_instance(self):
+        root = tempfile.mkdtemp()
+        try:
+            file_path = os.path.join(root, "test/core/test/v0.0.1/a.json")
+            os.makedirs(os.path.dirname(file_path))
+            content = {"@context": {"schema": "http://schema.org/"}, "schema:identifier": "a"}
+            with open(file_path, "w") as f:
+                json.dump(content, f)
+            # the write response of a lazily refreshed repository - the document is only loaded on access
+            created = Instance("test/core/test/v0.0.1/a", {"@id": "http://nexus/v0/data/test/core/test/v0.0.1/a", "nxv:rev": 1}, Instance.path)
+            loader = MagicMock()
+            created.mark_stale(1, loader)
+            client = MagicMock()
+            client.config.NEXUS_NAMESPACE = "http://nexus"
+            client.config.NEXUS_PREFIX = "v0"
+            client.instances.find_by_field = MagicMock(return_value=None)
+            client.instances.create = MagicMock(return_value=created)
+            DataUploadUtils(client).create_instance_by_file(file_path, use_checksums=True)
+            with open(file_path + ".chksum") as f:
+                manifest = json.load(f)
+            self.assertEqual(manifest["hashcode"], Entity.do_get_checksum(Entity.fully_qualify(copy.deepcopy(content))))
+            self.assertEqual(manifest["@id"], "http://nexus/v0/data/test/core/test/v0.0.1/a")
+            self.assertEqual(manifest["revision"], 1)
+            loader.assert_not_called()
+        finally:
+            shutil.rmtree(root)
+
+    def test_unchanged_instances_are_skipped_by_checksum(self):
+        root = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(root, "test/core/test/v0.0.1"))
+            for identifier in ("a", "b"):
+                with open(os.path.join(root, "test/core/test/v0.0.1", identifier + ".json"), "w") as f:
+                    json.dump({"@context": {"schema": "http://schema.org/"}, "schema:identifier": identifier}, f)
+
+            def upload_instance(data, schema_data, fail_if_linked_instance_is_missing):
+                identifier = json.loads(data)["schema:identifier"]
+                return Instance("test/core/test/v0.0.1/" + identifier, {"@id": "http://nexus/v0/data/test/core/test/v0.0.1/" + identifier,
+                                                                     "nxv:rev": 1}, Instance.path), "hash-" + identifier
+            client = MagicMock()
+            client.config.NEXUS_NAMESPACE = "http://nexus"
+            client.config.NEXUS_PREFIX = "v0"
+            data_upload_utils = DataUploadUtils(client)
+            data_upload_utils.upload_instance = MagicMock(side_effect=upload_instance)
+            self.assertEqual(len(data_upload_utils.create_instances_by_directory(root, use_checksums=True)), 2)
+            with open(os.path.join(root, "test/core/test/v0.0.1/a.json.chksum")) as f:
+                manifest = json.load(f)
+            self.assertEqual(manifest["id"], "test/core/test/v0.0.1/a")
+            self.assertEqual(manifest["hashcode"], "hash-a")
+            self.assertEqual(manifest["revision"], 1)
+
+            with open(os.path.join(root, "test/core/test/v0.0.1/b.json"), "w") as f:
+                json.dump({"@context": {"schema": "http://schema.org/"}, "schema:identifier": "b", "schema:name": "changed"}, f)
+            data_upload_utils = DataUploadUtils(client)
+            data_upload_utils.upload_instance = MagicMock(side_effect=upload_instance)
+            self.assertEqual([instance.id for instance in data_upload_utils.create_instances_by_directory(root, use_checksums=True)],
+                             ["test/core/test/v0.0.1/b"])
+            self.assertEqual(data_upload_utils.resolve_identifier(data_upload_utils._identifier_query("test/core/test/v0.0.1", "a")),
+                             "http://nexus/v0/data/test/core/test/v0.0.1/a")
+
+            DataUploadUtils.clear_all_checksums(root)
+            self.assertEqual(len(data_upload_utils.create_instances_by_directory(root, use_checksums=True)), 2)
+        finally:
+            shutil.rmtree(root)
+
+    def test_create_instances_by_turtle_file(self):
+        root = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(root, "test/core/person/v0.0.1"))
+            file_path = os.path.join(root, "test/core/person/v0.0.1/people.ttl")
+            with open(file_path, "w") as f:
+                f.write("@prefix foaf: <http://xmlns.com/foaf/0.1/> .\n")
+                for index in range(20):
+                    f.write("<http://example.org/person/{0}> a foaf:Person ; foaf:name \"Person {0}\" .\n".format(index))
+            data_upload_utils = DataUploadUtils(MagicMock())
+            data_upload_utils.create_instance = MagicMock(side_effect=lambda data, schema_data, fail: data["@id"])
+            uploaded = data_upload_utils.create_instances_by_turtle_file(file_path, max_workers=2)
+            self.assertEqual(sorted(uploaded), sorted("http://example.org/person/{}".format(index) for index in range(20)))
+            self.assertEqual(data_upload_utils.create_instance.call_args[0][1].name, "person")
+        finally:
+            shutil.rmtree(root)
+
+    def test_resolve_identifiers_in_one_request_per_schema(self):
+        def found(identifier):
+            return Instance("test/core/test/v0.0.1/" + identifier, {"@id": "http://nexus/v0/data/test/core/test/v0.0.1/" + identifier,
+                                                                 "http://schema.org/identifier": identifier}, Instance.path)
+        client = MagicMock()
+        client.instances.iter = MagicMock(return_value=[found("b"), found("a")])
+        client.instances.list_by_full_subpath = MagicMock(return_value=None)
+        data_upload_utils = DataUploadUtils(client)
+        payload = {"@context": {"test": "http://test.org#"},
+                   "test:relationA": "{{resolve_by_identifier /test/core/test/v0.0.1/ a}}",
+                   "test:relationB": ["{{resolve_by_identifier /test/core/test/v0.0.1/ b}}", "{{resolve_by_identifier /test/core/test/v0.0.1/ c}}"]}
+        result = json.loads(data_upload_utils.resolve_entities(json.dumps(payload), False))
+        self.assertEqual(client.instances.iter.call_count, 1)
+        filter_query = json.loads(client.instances.iter.call_args[1]["filter_query"])
+        self.assertEqual(filter_query["op"], "or")
+        self.assertEqual([f["value"] for f in filter_query["value"]], ["a", "b", "c"])
+        self.assertEqual(result["test:relationA"], {"@id": "http://nexus/v0/data/test/core/test/v0.0.1/a"})
+        self.assertEqual(result["test:relationB"], [{"@id": "http://nexus/v0/data/test/core/test/v0.0.1/b"}, {"@id": ""}])
+        # only the identifier which could not be found in the batch is looked up again
+        self.assertEqual(client.instances.list_by_full_subpath.call_count, 1)
+
+    def test_identifiers_are_chunked(self):
+        chunks = list(DataUploadUtils._chunk_identifiers(["a", "b", "c", "d", "e"], 10000, 2))
+        self.assertEqual(chunks, [["a", "b"], ["c", "d"], ["e"]])
@@ -0,0 +1,66 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+#
+#
+
+
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mock.mock import MagicMock
+
+from pyxus.resources.entity import Context
+from pyxus.utils.document_loader import CachingDocumentLoader, DocumentNotCachedError
+
+CONTEXT_URL = "http://nexus/v0/contexts/test/core/ctx/v0.0.1"
+CONTEXT = {"@id": CONTEXT_URL, "@context": {"schema": "http://schema.org/"}}
+
+
+class TestCachingDocumentLoader(TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_remote_documents_are_fetched_once(self):
+        fallback = MagicMock(return_value={"contextUrl": None, "documentUrl": CONTEXT_URL, "document": CONTEXT})
+        loader = CachingDocumentLoader(fallback=fallback)
+        loader(CONTEXT_URL)
+        result = loader(CONTEXT_URL + "#fragment")
+        self.assertEqual(result["document"], CONTEXT)
+        self.assertEqual(fallback.call_count, 1)
+        self.assertEqual(loader.stats()["hits"], 1)
+
+    def test_documents_are_persisted(self):
+        CachingDocumentLoader(self.cache_dir).seed(CONTEXT_URL, CONTEXT)
+        loader = CachingDocumentLoader(self.cache_dir, offline=True)
+        self.assertEqual(loader(CONTEXT_URL)["document"], CONTEXT)
+        self.assertRaises(DocumentNotCachedError, loader, "http://nexus/v0/contexts/test/core/other/v0.0.1")
+
+    def test_seed_from_repository(self):
+        repository = MagicMock()
+        repository.iter = MagicMock(return_value=[Context("test/core/ctx/v0.0.1", CONTEXT, Context.path)])
+        loader = CachingDocumentLoader(offline=True)
+        self.assertEqual(loader.seed_from_repository(repository), 1)
+        self.assertEqual(loader(CONTEXT_URL)["document"], CONTEXT)
+        repository.iter.assert_called_once_with(None, resolved=True)
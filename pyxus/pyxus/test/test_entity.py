@@ -23,10 +23,12 @@
 
 import logging
 import os
+import tempfile
+import time
 from unittest import TestCase
 
 from pyxus.resources.constants import ENV_VAR_HASHCODE_NAMESPACE, ENV_VAR_NEXUS_NAMESPACE
-from pyxus.resources.entity import Entity, Schema
+from pyxus.resources.entity import DocumentHasher, Entity, Schema
 from pyxus.test import env_setup
 
 
@@ -89,4 +91,44 @@ class TestEntity(TestCase):
         checksum1 = Entity.do_get_checksum(data1)
         checksum2 = Entity.do_get_checksum(data2)
 
-        self.assertEqual(checksum1, checksum2)
\ No newline at end of file
+        self.assertEqual(checksum1, checksum2)
+
+    def test_checksum_is_independent_of_key_order(self):
+        hasher = DocumentHasher()
+        self.assertEqual(hasher.checksum({"a": 1, "b": {"c": [1, 2], "d": None}}),
+                         hasher.checksum({"b": {"d": None, "c": [1, 2]}, "a": 1}))
+        self.assertNotEqual(hasher.checksum({"a": 1}), hasher.checksum({"a": 2}))
+
+    def test_file_checksum_is_memoized(self):
+        hasher = DocumentHasher()
+        file_descriptor, file_path = tempfile.mkstemp()
+        try:
+            with os.fdopen(file_descriptor, "w") as f:
+                f.write("{}")
+            modified = time.time() - 60
+            os.utime(file_path, (modified, modified))
+            checksum = hasher.checksum_file(file_path)
+            hasher.digest = None
+            self.assertEqual(hasher.checksum_file(file_path), checksum)
+        finally:
+            os.remove(file_path)
+
+    def test_checksum_file_of_a_recently_modified_file_is_not_memoized(self):
+        hasher = DocumentHasher()
+        file_descriptor, file_path = tempfile.mkstemp()
+        try:
+            with os.fdopen(file_descriptor, "w") as f:
+                f.write("{}")
+            modified = time.time()
+            os.utime(file_path, (modified, modified))
+            checksum = hasher.checksum_file(file_path)
+            # an edit of the same size within the resolution of a coarse modification time
+            with open(file_path, "w") as f:
+                f.write("[]")
+            os.utime(file_path, (modified, modified))
+            self.assertNotEqual(hasher.checksum_file(file_path), checksum)
+        finally:
+            os.remove(file_path)
+
+    def test_unknown_algorithm(self):
+        self.assertRaises(ValueError, DocumentHasher, algorithm="unknown")
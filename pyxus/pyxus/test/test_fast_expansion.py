@@ -0,0 +1,59 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+#
+#
+
+
+from unittest import TestCase
+
+from pyxus.utils.fast_expansion import fully_qualify
+
+
+class TestFastExpansion(TestCase):
+
+    def test_prefixes_are_replaced(self):
+        data = {"@context": {"schema": "http://schema.org/", "nsg": "https://nexus.example.org/vocab/"},
+                "@type": ["nsg:Dataset"], "@id": "https://nexus.example.org/v0/data/test/core/dataset/v0.0.1/a",
+                "schema:name": "a", "nsg:parts": [{"@id": "nsg:b"}, {"@id": "http://example.org/c"}], "nsg:size": [1],
+                "nsg:empty": None, "nsg:nested": {"schema": "d", "nsg:values": [None, 1.5, True]}}
+        expected = {"@id": "https://nexus.example.org/v0/data/test/core/dataset/v0.0.1/a",
+                    "@type": "https://nexus.example.org/vocab/Dataset",
+                    "http://schema.org/name": "a",
+                    "https://nexus.example.org/vocab/nested": {"http://schema.org/": "d", "https://nexus.example.org/vocab/values": [1.5, True]},
+                    "https://nexus.example.org/vocab/parts": [{"@id": "https://nexus.example.org/vocab/b"}, {"@id": "http://example.org/c"}],
+                    "https://nexus.example.org/vocab/size": 1}
+        result = fully_qualify(data)
+        self.assertEqual(result, expected)
+        self.assertEqual(list(result.keys()), sorted(expected.keys()))
+
+    def test_fully_qualified_documents_are_kept(self):
+        data = {"@type": "http://schema.org/Person", "http://schema.org/name": {"@value": "a"}, "nxv:rev": 2}
+        self.assertEqual(fully_qualify(data), {"@type": "http://schema.org/Person", "http://schema.org/name": "a", "nxv:rev": 2})
+
+    def test_unsupported_documents(self):
+        self.assertIsNone(fully_qualify({"@context": "http://example.org/context", "schema:name": "a"}))
+        self.assertIsNone(fully_qualify({"@context": {"@vocab": "http://schema.org/"}, "name": "a"}))
+        self.assertIsNone(fully_qualify({"@context": {"id": "@id"}, "id": "http://example.org/a", "http://schema.org/name": "a"}))
+        self.assertIsNone(fully_qualify({"@context": {"name": {"@id": "http://schema.org/name"}}, "name": "a"}))
+        self.assertIsNone(fully_qualify({"name": "a"}))
+        self.assertIsNone(fully_qualify({"@id": "relative", "http://schema.org/name": "a"}))
+        self.assertIsNone(fully_qualify({"http://schema.org/name": {"@value": "a", "@language": "en"}}))
+        self.assertIsNone(fully_qualify({"@context": {"schema": "http://schema.org/"}, "schema:name": "a", "http://schema.org/name": "b"}))
+        self.assertIsNone(fully_qualify({"@id": "http://example.org/a"}))
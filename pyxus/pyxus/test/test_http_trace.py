@@ -0,0 +1,128 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+#
+#
+
+
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mock.mock import MagicMock, patch
+from requests import Response
+from requests.exceptions import HTTPError, Timeout
+
+from pyxus.client import NexusClient
+from pyxus.utils.blazegraph import BlazegraphClient
+from pyxus.utils.http_trace import (RecordingHttpClient, ReplayedError, ReplayHttpClient, ReplaySession, RequestNotRecordedError,
+                                    TraceWriter, read_trace)
+
+RESULT = json.dumps({"head": {"vars": ["rel"]}, "results": {"bindings": [{"rel": {"type": "uri", "value": "http://nexus/v0/data/a"}}]}})
+
+
+def _response(status_code, content):
+    response = Response()
+    response.status_code = status_code
+    response._content = content.encode("utf-8")
+    response.headers["Content-Type"] = "application/json"
+    return response
+
+
+class TestHttpTrace(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "trace.jsonl.gz")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_record_and_replay(self):
+        http_client = MagicMock()
+        http_client.get = MagicMock(side_effect=[{"nxv:rev": 1}, {"nxv:rev": 2}, Timeout("timed out")])
+        http_client.put = MagicMock(side_effect=HTTPError("conflict", response=_response(409, '{"code": "IncorrectRevisionProvided"}')))
+        with TraceWriter(self.path) as trace:
+            recording = RecordingHttpClient(http_client, trace)
+            recording.get("/data/a")
+            recording.get("/data/a")
+            self.assertRaises(Timeout, recording.get, "/data/a")
+            self.assertRaises(HTTPError, recording.put, "/data/a?rev=1", {"b": 1, "a": 2})
+        records = list(read_trace(self.path))
+        self.assertEqual([(r["method"], r["url"]) for r in records], [("get", "/data/a")] * 3 + [("put", "/data/a?rev=1")])
+        self.assertTrue(all(r["duration"] >= 0 for r in records))
+
+        sleeps = []
+        replay = ReplayHttpClient(self.path, realtime=True, sleep=sleeps.append)
+        try:
+            replay.put("/data/a?rev=1", {"a": 2, "b": 1})
+            self.fail("the recorded error has to be raised")
+        except HTTPError as e:
+            self.assertEqual(e.response.status_code, 409)
+            self.assertEqual(e.response.json(), {"code": "IncorrectRevisionProvided"})
+        # the exchanges of the same request are served in the recorded order - the last one is repeated
+        self.assertEqual(replay.get("/data/a"), {"nxv:rev": 1})
+        self.assertEqual(replay.get("/data/a"), {"nxv:rev": 2})
+        self.assertRaises(Timeout, replay.get, "/data/a")
+        self.assertRaises(Timeout, replay.get, "/data/a")
+        self.assertRaises(RequestNotRecordedError, replay.get, "/data/b")
+        self.assertEqual(len(sleeps), 5)
+
+    def test_other_exceptions_are_recorded(self):
+        class CustomError(Exception):
+            pass
+        http_client = MagicMock()
+        http_client.get = MagicMock(side_effect=[ValueError("no JSON"), CustomError("failed")])
+        with TraceWriter(self.path) as trace:
+            recording = RecordingHttpClient(http_client, trace)
+            self.assertRaises(ValueError, recording.get, "/data/a")
+            self.assertRaises(CustomError, recording.get, "/data/b")
+        replay = ReplayHttpClient(self.path)
+        self.assertRaises(ValueError, replay.get, "/data/a")
+        with self.assertRaises(ReplayedError) as context:
+            replay.get("/data/b")
+        self.assertEqual(context.exception.type_name, "CustomError")
+
+    def test_nexus_client(self):
+        data = {"@id": "http://nexus/v0/schemas/org/dom/schema/v1.0.0", "nxv:rev": 3}
+        recording_client = NexusClient("http", "nexus", "v0", "http://nexus", record_trace=self.path)
+        recording_client._http_client._http_client = MagicMock()
+        recording_client._http_client._http_client.get = MagicMock(return_value=data)
+        self.assertEqual(recording_client.schemas.read("org", "dom", "schema", "v1.0.0").get_revision(), 3)
+        recording_client.trace.close()
+
+        replay_client = NexusClient("http", "nexus", "v0", "http://nexus", replay_trace=self.path)
+        self.assertEqual(replay_client.schemas.read("org", "dom", "schema", "v1.0.0").data, data)
+
+    def test_blazegraph_client(self):
+        path = os.path.join(self.directory, "trace.jsonl")
+        query = "SELECT ?rel WHERE {?rel ?p ?o}"
+        with patch("pyxus.utils.blazegraph.requests.Session.post", MagicMock(side_effect=[_response(200, RESULT)] * 2)):
+            client = BlazegraphClient("http://blazegraph", "http://nexus", record_trace=path)
+            recorded = client.query(query)
+            self.assertEqual(list(client.iter_query(query)), recorded)
+            client.trace.close()
+
+        replay_client = BlazegraphClient("http://blazegraph", "http://nexus", replay_trace=path)
+        self.assertIsInstance(replay_client._session, ReplaySession)
+        self.assertEqual(replay_client.query(query), recorded)
+        self.assertEqual(list(replay_client.iter_query(query)), recorded)
+        self.assertRaises(RequestNotRecordedError, replay_client.query, "SELECT ?s WHERE {?s ?p ?o}")
@@ -0,0 +1,77 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+#
+#
+
+import gc
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mock.mock import MagicMock
+
+from pyxus.utils.data_upload_utils import DataUploadUtils
+from pyxus.utils.identifier_cache import SqliteIdentifierCache
+
+
+class TestSqliteIdentifierCache(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "identifiers.db")
+        self.now = 1000
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_resolutions_are_shared_between_caches_of_the_same_file(self):
+        SqliteIdentifierCache(self.path).put("/org/dom/schema/v1.0.0?filter=foo", "http://nexus/v0/data/org/dom/schema/v1.0.0/123")
+        self.assertEqual(SqliteIdentifierCache(self.path).get("/org/dom/schema/v1.0.0?filter=foo"),
+                         "http://nexus/v0/data/org/dom/schema/v1.0.0/123")
+
+    def test_resolutions_expire(self):
+        cache = SqliteIdentifierCache(self.path, ttl=60, clock=lambda: self.now)
+        cache.put("query", "http://nexus/v0/data/org/dom/schema/v1.0.0/123")
+        self.now += 59
+        self.assertIsNotNone(cache.get("query"))
+        self.now += 2
+        self.assertIsNone(cache.get("query"))
+
+    def test_deprecation_through_pyxus_invalidates_the_resolution(self):
+        cache = SqliteIdentifierCache(self.path)
+        cache.put("query", "http://nexus/v0/data/org/dom/schema/v1.0.0/123")
+        cache.put("other", "http://nexus/v0/data/org/dom/schema/v1.0.0/456")
+        client = MagicMock()
+        data_upload_utils = DataUploadUtils(client, id_cache=cache)
+        listener = client.instances.add_listener.call_args[0][0]
+        listener("delete", MagicMock(id="org/dom/schema/v1.0.0/123"))
+        self.assertIsNone(SqliteIdentifierCache(self.path).get("query"))
+        self.assertIsNotNone(SqliteIdentifierCache(self.path).get("other"))
+        data_upload_utils.close()
+        client.instances.remove_listener.assert_called_once_with(listener)
+
+    def test_listener_does_not_keep_the_utils_alive(self):
+        client = MagicMock()
+        DataUploadUtils(client)
+        listener = client.instances.add_listener.call_args[0][0]
+        gc.collect()
+        listener("delete", MagicMock(id="org/dom/schema/v1.0.0/123"))
+        client.instances.remove_listener.assert_called_once_with(listener)
@@ -0,0 +1,61 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+#
+#
+
+
+from unittest import TestCase
+
+from pyxus.resources.read_cache import ReadCache
+from pyxus.utils.metrics import Metrics, StatsdExporter
+
+
+class TestMetrics(TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics(buckets=(0.1, 1.0))
+        self.metrics.observe("Instance", "read", 0.05, size=10)
+        self.metrics.observe("Instance", "read", 0.5, size=20)
+        self.metrics.observe("Instance", "create", 2.0, error=True)
+
+    def test_snapshot(self):
+        operations = self.metrics.snapshot()["operations"]["Instance"]
+        self.assertEqual(operations["read"]["count"], 2)
+        self.assertEqual(operations["read"]["bytes"], 30)
+        self.assertEqual(operations["read"]["duration_buckets"], [(0.1, 1), (1.0, 2), (float("inf"), 2)])
+        self.assertEqual(operations["create"]["errors"], 1)
+        self.assertEqual(operations["create"]["duration_buckets"], [(0.1, 0), (1.0, 0), (float("inf"), 1)])
+
+    def test_prometheus(self):
+        cache = ReadCache()
+        cache.get("/data/a")
+        self.metrics.register_cache("read_cache", cache)
+        text = self.metrics.to_prometheus()
+        self.assertIn('pyxus_request_duration_seconds_bucket{entity="Instance",operation="read",le="0.1"} 1', text)
+        self.assertIn('pyxus_request_duration_seconds_bucket{entity="Instance",operation="read",le="+Inf"} 2', text)
+        self.assertIn('pyxus_request_errors_total{entity="Instance",operation="create"} 1', text)
+        self.assertIn('pyxus_cache_misses_total{cache="read_cache"} 1', text)
+
+    def test_statsd_exporter(self):
+        sent = []
+        self.metrics.add_exporter(StatsdExporter(lambda name, value, metric_type: sent.append((name, value, metric_type))))
+        self.metrics.observe("Schema", "publish", 0.25, error=True)
+        self.assertEqual(sent, [("pyxus.schema.publish.duration", 250.0, "ms"), ("pyxus.schema.publish.requests", 1, "c"),
+                                ("pyxus.schema.publish.errors", 1, "c")])
@@ -0,0 +1,69 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+#
+#
+
+
+from unittest import TestCase
+
+from pyxus.utils.query_cache import QueryCache, normalize_query
+
+
+class TestQueryCache(TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.cache = QueryCache(max_size=2, max_bytes=10, ttl=5, clock=lambda: self.now)
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query("SELECT ?s  # all\n WHERE {\n  ?s <http://x/a#b> \"a  b\" }"),
+                         "SELECT ?s WHERE { ?s <http://x/a#b> \"a  b\" }")
+
+    def test_formatting_shares_entry(self):
+        self.cache.put("SELECT ?s WHERE { ?s ?p ?o }", b"abc")
+        self.assertEqual(self.cache.get("SELECT ?s\n  WHERE {?s ?p ?o }".replace("{?", "{ ?")), b"abc")
+        self.assertEqual(self.cache.stats()["bytes_saved"], 3)
+
+    def test_ttl(self):
+        self.cache.put("q", b"abc")
+        self.now = 6
+        self.assertIsNone(self.cache.get("q"))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_eviction(self):
+        self.cache.put("a", b"1234")
+        self.cache.put("b", b"1234")
+        self.cache.get("a")
+        self.cache.put("c", b"12")
+        self.assertIsNone(self.cache.get("b"))
+        self.cache.put("d", b"12345678")
+        self.assertIsNone(self.cache.get("a"))
+        self.assertEqual(self.cache.stats()["bytes"], 10)
+        self.cache.put("e", b"12345678901")
+        self.assertIsNone(self.cache.get("e"))
+
+    def test_invalidate(self):
+        self.cache.put("a", b"1")
+        self.cache.put("b", b"2")
+        self.cache.invalidate("a")
+        self.assertIsNone(self.cache.get("a"))
+        self.cache.invalidate()
+        self.assertEqual(self.cache.stats()["bytes"], 0)
+        self.assertEqual(len(self.cache), 0)
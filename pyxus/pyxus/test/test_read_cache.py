@@ -0,0 +1,72 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+#
+#
+
+from unittest import TestCase
+
+from mock.mock import MagicMock
+
+from pyxus.resources.read_cache import ReadCache
+from pyxus.resources.repository import SchemaRepository
+
+
+class TestReadCache(TestCase):
+
+    def setUp(self):
+        self.now = 100
+        self.cache = ReadCache(max_size=2, latest_ttl=5, clock=lambda: self.now)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.put("/a", 1, {"a": 1})
+        self.cache.put("/b", 1, {"b": 1})
+        self.cache.get("/a", 1)
+        self.cache.put("/c", 1, {"c": 1})
+        self.assertIsNone(self.cache.get("/b", 1))
+        self.assertEqual(self.cache.get("/a", 1), {"a": 1})
+        self.assertEqual(self.cache.get("/c", 1), {"c": 1})
+        self.assertEqual(self.cache.stats()["hits"], 3)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_only_latest_revision_expires(self):
+        self.cache.put("/a", None, {"nxv:rev": 2})
+        self.cache.put("/a", 2, {"nxv:rev": 2})
+        self.now += 10
+        self.assertIsNone(self.cache.get("/a"))
+        self.assertEqual(self.cache.get("/a", 2), {"nxv:rev": 2})
+
+    def test_returned_documents_are_copies(self):
+        self.cache.put("/a", 1, {"a": 1})
+        self.cache.get("/a", 1)["a"] = 2
+        self.assertEqual(self.cache.get("/a", 1), {"a": 1})
+
+    def test_repository_reads_through_cache_and_writes_invalidate(self):
+        http_client = MagicMock()
+        http_client.get = MagicMock(return_value={"nxv:rev": 1})
+        http_client.put = MagicMock(return_value={"nxv:rev": 2})
+        repository = SchemaRepository(http_client, read_cache=ReadCache())
+        schema = repository.read("org", "dom", "schema", "v1.0.0")
+        repository.read("org", "dom", "schema", "v1.0.0")
+        self.assertEqual(http_client.get.call_count, 1)
+        repository.update(schema)
+        repository.read("org", "dom", "schema", "v1.0.0")
+        repository.read("org", "dom", "schema", "v1.0.0", revision=2)
+        self.assertEqual([c[0][0] for c in http_client.get.call_args_list],
+                         ["/schemas/org/dom/schema/v1.0.0", "/schemas/org/dom/schema/v1.0.0?rev=2", "/schemas/org/dom/schema/v1.0.0"])
@@ -0,0 +1,209 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+#
+#
+
+from unittest import TestCase
+
+from mock.mock import MagicMock
+from requests.exceptions import HTTPError
+
+from pyxus.resources.entity import Schema, SearchResult, SearchResultList
+from pyxus.resources.repository import IncompleteListingError, InstanceRepository, ResolveAllError, SchemaRepository
+from pyxus.resources.read_cache import ReadCache
+from pyxus.resources.revision_table import RevisionTable
+from pyxus.utils.metrics import Metrics
+
+
+def _search_result(identifier):
+    return {
+        "resultId": "http://nexus/v0/data/org/dom/schema/v1.0.0/{}".format(identifier),
+        "source": {
+            "@id": "http://nexus/v0/data/org/dom/schema/v1.0.0/{}".format(identifier),
+            "links": {"self": "http://nexus/v0/data/org/dom/schema/v1.0.0/{}".format(identifier)}
+        }
+    }
+
+
+def _page(identifiers, total, next_link=None):
+    links = {"self": "http://nexus/v0/data/org/dom/schema/v1.0.0"}
+    if next_link is not None:
+        links["next"] = next_link
+    return {"total": total, "results": [_search_result(i) for i in identifiers], "links": links}
+
+
+class TestRepository(TestCase):
+
+    def setUp(self):
+        self.http_client = MagicMock()
+        self.repository = InstanceRepository(self.http_client)
+
+    def test_iter_follows_next_links(self):
+        for prefetch in (True, False):
+            self.http_client.get.reset_mock()
+            self.http_client.get.side_effect = [
+                _page(["a", "b"], 5, "http://nexus/v0/data/org/dom/schema/v1.0.0?from=2&size=2"),
+                _page(["c", "d"], 5, "http://nexus/v0/data/org/dom/schema/v1.0.0?from=4&size=2"),
+                _page(["e"], 5)
+            ]
+            results = [r.self_link.rsplit("/", 1)[1] for r in self.repository.iter("/org/dom/schema/v1.0.0", size=2, prefetch=prefetch)]
+            self.assertEqual(results, ["a", "b", "c", "d", "e"])
+            self.assertEqual(self.http_client.get.call_count, 3)
+
+    def test_iter_is_lazy(self):
+        self.http_client.get = MagicMock(side_effect=[
+            _page(["a", "b"], 4, "http://nexus/v0/data/org/dom/schema/v1.0.0?from=2&size=2"),
+            _page(["c", "d"], 4, "http://nexus/v0/data/org/dom/schema/v1.0.0?from=4&size=2")
+        ])
+        iterator = self.repository.iter(size=2, prefetch=False)
+        next(iterator)
+        self.assertEqual(self.http_client.get.call_count, 1)
+
+    def test_list_all_requests_remaining_pages_by_offset(self):
+        pages = {
+            "0": _page(["a", "b"], 5, "next"),
+            "2": _page(["c", "d"], 5, "next"),
+            "4": _page(["e"], 5)
+        }
+        self.http_client.get = MagicMock(side_effect=lambda path: pages[path.split("from=")[1].split("&")[0]])
+        result = self.repository.list_all(subpath="/org/dom/schema/v1.0.0", size=2, max_workers=2)
+        self.assertEqual(result.total, 5)
+        self.assertEqual([r.self_link.rsplit("/", 1)[1] for r in result.results], ["a", "b", "c", "d", "e"])
+        self.assertIsNone(result.get_next_link())
+        self.assertEqual(self.http_client.get.call_count, 3)
+
+    def test_list_all_steps_by_the_page_size_of_the_server(self):
+        # 4 results per page are requested but the server only returns 2 (and only 1 for the second page)
+        pages = {
+            "0": _page(["a", "b"], 6, "next"),
+            "2": _page(["c"], 6, "next"),
+            "3": _page(["d", "e"], 6, "next"),
+            "4": _page(["e", "f"], 6)
+        }
+        self.http_client.get = MagicMock(side_effect=lambda path: pages[path.split("from=")[1].split("&")[0]])
+        result = self.repository.list_all(subpath="/org/dom/schema/v1.0.0", size=4, max_workers=2)
+        self.assertEqual([r.self_link.rsplit("/", 1)[1] for r in result.results], ["a", "b", "c", "d", "e", "f"])
+
+    def test_list_all_raises_if_the_pages_do_not_add_up(self):
+        pages = {"0": _page(["a", "b"], 4, "next"), "2": _page(["c"], 4), "3": _page([], 4)}
+        self.http_client.get = MagicMock(side_effect=lambda path: pages[path.split("from=")[1].split("&")[0]])
+        with self.assertRaises(IncompleteListingError) as context:
+            self.repository.list_all(subpath="/org/dom/schema/v1.0.0", size=2)
+        self.assertEqual(len(context.exception.results), 3)
+
+    def test_resolve_all_keeps_order_and_collects_failures(self):
+        def read(path):
+            if path.endswith("/b"):
+                raise ValueError("failed")
+            return {"@id": path}
+        self.http_client.get = MagicMock(side_effect=read)
+        search_results = SearchResultList(3, [SearchResult(_search_result(i)) for i in ("a", "b", "c")], {})
+        with self.assertRaises(ResolveAllError) as context:
+            self.repository.resolve_all(search_results, max_workers=3)
+        self.assertEqual([r.id if r is not None else None for r in context.exception.results],
+                         ["org/dom/schema/v1.0.0/a", None, "org/dom/schema/v1.0.0/c"])
+        self.assertEqual(list(context.exception.errors.keys()), [1])
+        self.assertEqual(self.http_client.get.call_count, 3)
+
+    def test_update_with_lazy_refresh_defers_the_read(self):
+        repository = SchemaRepository(self.http_client, lazy_refresh=True)
+        self.http_client.put = MagicMock(return_value={"nxv:rev": 3})
+        self.http_client.get = MagicMock(return_value={"nxv:rev": 3, "foo": "bar"})
+        schema = Schema.create_new("org", "dom", "schema", "v1.0.0", {"nxv:rev": 2})
+        repository.update(schema)
+        self.assertTrue(schema.is_stale())
+        self.assertEqual(schema.get_revision(), 3)
+        self.http_client.get.assert_not_called()
+        self.assertEqual(schema.data["foo"], "bar")
+        self.http_client.get.assert_called_once_with("/schemas/org/dom/schema/v1.0.0?rev=3")
+        self.assertFalse(schema.is_stale())
+
+    def test_failed_lazy_refresh_is_retried(self):
+        repository = SchemaRepository(self.http_client, lazy_refresh=True)
+        self.http_client.put = MagicMock(return_value={"nxv:rev": 3})
+        self.http_client.get = MagicMock(side_effect=[HTTPError(response=MagicMock(status_code=503)), {"nxv:rev": 3, "foo": "bar"}])
+        schema = Schema.create_new("org", "dom", "schema", "v1.0.0", {"nxv:rev": 2})
+        repository.update(schema)
+        with self.assertRaises(HTTPError):
+            schema.data
+        self.assertTrue(schema.is_stale())
+        self.assertEqual(schema.get_revision(), 3)
+        self.assertEqual(schema.data["foo"], "bar")
+        self.assertFalse(schema.is_stale())
+
+    def test_failing_listener_does_not_fail_the_write(self):
+        repository = SchemaRepository(self.http_client, lazy_refresh=True)
+        self.http_client.put = MagicMock(return_value={"nxv:rev": 3})
+        failing = MagicMock(side_effect=ValueError("listener failed"))
+        listener = MagicMock()
+        repository.add_listener(failing)
+        repository.add_listener(listener)
+        schema = Schema.create_new("org", "dom", "schema", "v1.0.0", {"nxv:rev": 2})
+        self.assertIs(repository.update(schema), schema)
+        listener.assert_called_once_with("update", schema)
+        repository.remove_listener(failing)
+        repository.remove_listener(failing)
+
+    def test_delete_uses_the_tracked_revision(self):
+        repository = SchemaRepository(self.http_client, revision_table=RevisionTable())
+        self.http_client.get = MagicMock(return_value={"nxv:rev": 4, "nxv:deprecated": False})
+        schema = repository.read("org", "dom", "schema", "v1.0.0")
+        self.http_client.get.reset_mock()
+        self.http_client.delete = MagicMock(return_value={"nxv:rev": 5})
+        repository.delete(schema)
+        self.http_client.delete.assert_called_once_with("/schemas/org/dom/schema/v1.0.0?rev=4")
+        self.http_client.get.assert_called_once_with("/schemas/org/dom/schema/v1.0.0?rev=5")
+
+    def test_outdated_tracked_revision_is_retried_with_the_last_revision(self):
+        revision_table = RevisionTable()
+        revision_table.record("/schemas/org/dom/schema/v1.0.0", 2)
+        repository = SchemaRepository(self.http_client, lazy_refresh=True, revision_table=revision_table)
+        conflict = HTTPError(response=MagicMock(status_code=409))
+        self.http_client.patch = MagicMock(side_effect=[conflict, {"nxv:rev": 4}])
+        self.http_client.get = MagicMock(return_value={"nxv:rev": 3})
+        schema = Schema.create_new("org", "dom", "schema", "v1.0.0", {})
+        repository.publish(schema, True)
+        self.assertEqual([c[0][0] for c in self.http_client.patch.call_args_list],
+                         ["/schemas/org/dom/schema/v1.0.0/config?rev=2", "/schemas/org/dom/schema/v1.0.0/config?rev=3"])
+        self.assertEqual(revision_table.get("/schemas/org/dom/schema/v1.0.0"), 4)
+
+    def test_outdated_tracked_revision_bypasses_the_read_cache(self):
+        repository = SchemaRepository(self.http_client, revision_table=RevisionTable(), read_cache=ReadCache())
+        self.http_client.get = MagicMock(return_value={"nxv:rev": 1})
+        schema = repository.read("org", "dom", "schema", "v1.0.0")
+        # the schema was updated to revision 5 by someone else in the meantime
+        self.http_client.get = MagicMock(return_value={"nxv:rev": 5})
+        self.http_client.patch = MagicMock(side_effect=[HTTPError(response=MagicMock(status_code=409)), {"nxv:rev": 6}])
+        repository.publish(schema, True)
+        self.assertEqual([c[0][0] for c in self.http_client.patch.call_args_list],
+                         ["/schemas/org/dom/schema/v1.0.0/config?rev=1", "/schemas/org/dom/schema/v1.0.0/config?rev=5"])
+
+    def test_metrics_per_entity_type_and_operation(self):
+        metrics = Metrics()
+        repository = SchemaRepository(self.http_client, metrics=metrics)
+        self.http_client.get = MagicMock(return_value={"nxv:rev": 1, "nxv:deprecated": False})
+        self.http_client.put = MagicMock(side_effect=HTTPError(response=MagicMock(status_code=500)))
+        schema = repository.read("org", "dom", "schema", "v1.0.0")
+        self.assertRaises(HTTPError, repository.update, schema)
+        operations = metrics.snapshot()["operations"]["Schema"]
+        self.assertEqual(operations["read"]["count"], 1)
+        self.assertEqual(operations["read"]["bytes"], len('{"nxv:rev": 1, "nxv:deprecated": false}'))
+        self.assertEqual(operations["update"]["errors"], 1)
+        self.assertEqual(operations["update"]["duration_buckets"][-1][1], 1)
@@ -0,0 +1,85 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+#
+#
+
+
+from unittest import TestCase
+
+from mock.mock import MagicMock
+from requests.exceptions import HTTPError, Timeout
+
+from pyxus.utils.scheduled_http_client import RequestBudget, ScheduledHttpClient
+
+
+def _http_error(status_code, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    return HTTPError(response=response)
+
+
+class TestScheduledHttpClient(TestCase):
+
+    def setUp(self):
+        self.sleeps = []
+        self.http_client = MagicMock()
+        self.client = ScheduledHttpClient(self.http_client, RequestBudget(concurrency=4, cooldown=10), RequestBudget(concurrency=2),
+                                          max_retries=3, backoff=1.0, sleep=self.sleeps.append, random_generator=lambda: 0.5)
+
+    def test_reads_are_retried_with_jittered_backoff(self):
+        self.http_client.get = MagicMock(side_effect=[_http_error(503), Timeout(), _http_error(429, {"Retry-After": "7"}), {"a": 1}])
+        self.assertEqual(self.client.get("/data/a"), {"a": 1})
+        self.assertEqual(self.sleeps, [0.5, 1.0, 7.0])
+        self.assertEqual(self.client.stats()["retries"], 3)
+        # the throttled requests were in flight within one cooldown period - the limit is only halved once
+        self.assertEqual(self.client.read_budget.stats()["limit"], 2)
+
+    def test_client_errors_and_writes_are_not_retried(self):
+        self.http_client.get = MagicMock(side_effect=_http_error(400))
+        self.assertRaises(HTTPError, self.client.get, "/data/a")
+        self.http_client.put = MagicMock(side_effect=_http_error(503))
+        self.assertRaises(HTTPError, self.client.put, "/data/a", {})
+        self.assertEqual(self.http_client.get.call_count + self.http_client.put.call_count, 2)
+        self.assertEqual(self.client.write_budget.stats()["limit"], 1)
+        self.assertEqual(self.client.read_budget.stats()["limit"], 4)
+
+    def test_retries_are_limited(self):
+        self.http_client.get = MagicMock(side_effect=_http_error(503))
+        self.assertRaises(HTTPError, self.client.get, "/data/a")
+        self.assertEqual(self.http_client.get.call_count, 4)
+
+
+class TestRequestBudget(TestCase):
+
+    def test_additive_increase(self):
+        budget = RequestBudget(concurrency=2, max_concurrency=3)
+        for _ in range(10):
+            budget.acquire()
+            budget.release()
+        self.assertEqual(budget.stats()["limit"], 3)
+
+    def test_token_bucket(self):
+        now = [0.0]
+        sleeps = []
+        budget = RequestBudget(rate=2, burst=2, concurrency=10, clock=lambda: now[0], sleep=sleeps.append)
+        for _ in range(4):
+            budget.acquire()
+        self.assertEqual(sleeps, [0.5, 1.0])
@@ -25,7 +25,8 @@ from unittest import TestCase
 from deepdiff import DeepDiff
 
 from pyxus.test import utils
-from pyxus.utils.turtle_schema_transformer import transform_turtle_to_jsonld_schema, transform_turtle_to_jsonld
+from pyxus.resources.entity import Instance
+from pyxus.utils.turtle_schema_transformer import iter_turtle_instances, transform_turtle_to_jsonld_schema, transform_turtle_to_jsonld
 
 
 class TestSchemaRepository(TestCase):
@@ -96,3 +97,39 @@ class TestSchemaRepository(TestCase):
     def test_create_turtle_instance(self):
         jsonld_instance = transform_turtle_to_jsonld(self.test_turtle_instance)
         assert cmp(jsonld_instance, self.expected_jsonld_instance) == 0
+
+    def test_iter_turtle_instances(self):
+        turtle = self.test_turtle_instance + \
+            "foaf_sh:Baz a foaf:Person ; foaf:knows foaf_sh:Foo , [ foaf:name \"Anonymous\" ] ; foaf:age 42 ."
+        instances = dict((instance["@id"], instance) for instance in iter_turtle_instances(turtle))
+        self.assertEqual(sorted(instances.keys()), ["http://foaf_sh.com/Baz", "http://foaf_sh.com/Foo"])
+        self.assertEqual(instances["http://foaf_sh.com/Foo"], self.expected_jsonld_instance[0])
+        baz = instances["http://foaf_sh.com/Baz"]
+        self.assertEqual(baz["http://xmlns.com/foaf/0.1/age"], [{"@type": "http://www.w3.org/2001/XMLSchema#integer", "@value": 42}])
+        self.assertEqual(sorted(baz["http://xmlns.com/foaf/0.1/knows"], key=lambda value: len(value)),
+                         [{"@id": "http://foaf_sh.com/Foo"}, {"http://xmlns.com/foaf/0.1/name": [{"@value": "Anonymous"}]}])
+
+    def test_create_turtle_instance_with_blank_node(self):
+        turtle = self.test_turtle_instance + "foaf_sh:Foo foaf:knows [ foaf:name \"Anonymous\" ] ."
+        instance = Instance.create_new("test", "core", "person", "v0.0.1", turtle, is_turtle=True)
+        self.assertEqual(instance.data["http://xmlns.com/foaf/0.1/knows"], [{"http://xmlns.com/foaf/0.1/name": [{"@value": "Anonymous"}]}])
+
+    def test_iter_turtle_instances_with_blank_node_cycle(self):
+        turtle = "@prefix foaf: <http://xmlns.com/foaf/0.1/> . _:a foaf:knows _:b . _:b foaf:knows _:a ; foaf:name \"B\" ."
+        instances = list(iter_turtle_instances(turtle))
+        self.assertEqual(len(instances), 1)
+        root = instances[0]
+        embedded = root["http://xmlns.com/foaf/0.1/knows"][0]
+        self.assertNotIn("@id", embedded)
+        self.assertEqual(embedded["http://xmlns.com/foaf/0.1/knows"], [{"@id": root["@id"]}])
+        self.assertTrue(root["@id"].startswith("_:"))
+
+    def test_iter_turtle_instances_with_shared_blank_node(self):
+        turtle = "@prefix foaf: <http://xmlns.com/foaf/0.1/> . @prefix ex: <http://example.org/> ." \
+                 "ex:a foaf:knows _:shared . ex:b foaf:knows _:shared . _:shared foaf:name \"Shared\" ."
+        instances = dict((instance["@id"], instance) for instance in iter_turtle_instances(turtle))
+        shared = [identifier for identifier in instances if identifier.startswith("_:")]
+        self.assertEqual(len(shared), 1)
+        self.assertEqual(instances[shared[0]]["http://xmlns.com/foaf/0.1/name"], [{"@value": "Shared"}])
+        self.assertEqual(instances["http://example.org/a"]["http://xmlns.com/foaf/0.1/knows"], [{"@id": shared[0]}])
+        self.assertEqual(instances["http://example.org/b"]["http://xmlns.com/foaf/0.1/knows"], [{"@id": shared[0]}])
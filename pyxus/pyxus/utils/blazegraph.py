@@ -19,15 +19,30 @@
 #  (Human Brain Project SGA1, SGA2 and SGA3).
 
 
+import codecs
+import csv
 import json
 import os
+import re
 
 import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from pyxus.client import ENV_VAR_NEXUS_NAMESPACE
+from pyxus.utils.http_trace import RecordingSession, ReplaySession, TraceWriter
+from pyxus.utils.query_cache import normalize_query
 
 ENV_VAR_BLAZEGRAPH = "BLAZEGRAPH_ENDPOINT"
 XSD_URI = "http://www.w3.org/2001/XMLSchema#"
+RESULT_FORMATS = {
+    "json": "application/sparql-results+json",
+    "csv": "text/csv",
+    "tsv": "text/tab-separated-values"
+}
+BINDINGS_START = re.compile(r'"bindings"\s*:\s*\[')
+SELECT_PROJECTION = re.compile(r"\bSELECT\s+(?:DISTINCT\s+|REDUCED\s+)?(.*?)\s*(?:WHERE\s*)?\{", re.IGNORECASE | re.DOTALL)
+PROJECTED_EXPRESSION = re.compile(r"\(.*?\bAS\s+(\?\w+)\s*\)", re.IGNORECASE | re.DOTALL)
 
 
 class BlazegraphClient(object):
@@ -35,7 +50,23 @@ class BlazegraphClient(object):
     Client to access Blazegraph SPARQL API
     """
 
-    def __init__(self, blazegraph_endpoint=None, nexus_namespace=None):
+    def __init__(self, blazegraph_endpoint=None, nexus_namespace=None, query_cache=None, record_trace=None, replay_trace=None):
+        """
+        :param query_cache: an optional QueryCache for the results of query()
+        :param record_trace: the path of a trace file (or a TraceWriter) all queries and their responses are written to
+        :param replay_trace: the path of a recorded trace file - its responses are served instead of querying blazegraph
+        """
+        self.query_cache = query_cache
+        # shared by all requests (and threads) to keep the connections alive
+        self._session = requests.Session()
+        self._session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=32))
+        self._session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=32))
+        if replay_trace is not None:
+            self._session = replay_trace if isinstance(replay_trace, ReplaySession) else ReplaySession(replay_trace)
+        self.trace = None
+        if record_trace is not None:
+            self.trace = record_trace if isinstance(record_trace, TraceWriter) else TraceWriter(record_trace)
+            self._session = RecordingSession(self._session, self.trace)
         if blazegraph_endpoint is None and ENV_VAR_BLAZEGRAPH in os.environ:
             self.BLAZEGRAPH_ENDPOINT = os.environ.get(ENV_VAR_BLAZEGRAPH)
         else:
@@ -57,18 +88,106 @@ class BlazegraphClient(object):
         :param raw: true if the result should be returned raw. False if the result should be JSON
         :return: the result from blazegraph
         """
-        query = {'query': query}
-        response = requests.post("{}/{}".format(self.BLAZEGRAPH_ENDPOINT, "bigdata/namespace/kg/sparql"), data=query,
-                                 headers={"Accept": "application/sparql-results+json", "Content-Type": "application/x-www-form-urlencoded"})
-        if response.status_code == 200:
-            if raw:
-                return response.content
-            else:
-                content = json.loads(response.content)
-                if content:
-                    return content["results"]["bindings"]
+        content = self.query_cache.get(query) if self.query_cache is not None else None
+        if content is None:
+            response = self._session.post("{}/{}".format(self.BLAZEGRAPH_ENDPOINT, "bigdata/namespace/kg/sparql"), data={'query': query},
+                                     headers={"Accept": "application/sparql-results+json", "Content-Type": "application/x-www-form-urlencoded"})
+            if response.status_code != 200:
                 return None
-        return None
+            content = response.content
+            if self.query_cache is not None:
+                self.query_cache.put(query, content)
+        if raw:
+            return content
+        else:
+            content = json.loads(content)
+            if content:
+                return content["results"]["bindings"]
+            return None
+
+    def invalidate_cache(self, operation=None, entity=None):
+        """
+        Drop all cached query results - can be registered as listener of the repositories (Repository.add_listener)
+        """
+        if self.query_cache is not None:
+            self.query_cache.invalidate()
+
+    def iter_query(self, query, result_format="json", chunk_size=65536):
+        """
+        Send a query to blazegraph and yield the result bindings one by one while the response is still being received
+        (the response is never held in memory as a whole)
+        :param query: the query
+        :param result_format: "json" yields the bindings as in the result of query(). "csv" and "tsv" are cheaper
+                              to parse and yield dicts of variable name to plain value (csv) or to the value in
+                              N-Triples syntax (tsv)
+        :param chunk_size: the number of bytes read at once
+        :return: a generator of the bindings - raises a requests.HTTPError if the query fails
+        """
+        response = self._session.post("{}/{}".format(self.BLAZEGRAPH_ENDPOINT, "bigdata/namespace/kg/sparql"), data={'query': query},
+                                 headers={"Accept": RESULT_FORMATS[result_format], "Content-Type": "application/x-www-form-urlencoded"},
+                                 stream=True)
+        try:
+            response.raise_for_status()
+            chunks = codecs.iterdecode(response.iter_content(chunk_size=chunk_size), "utf-8")
+            if result_format == "json":
+                for binding in _iter_json_bindings(chunks):
+                    yield binding
+            else:
+                for binding in _iter_tabular_bindings(chunks, "," if result_format == "csv" else "\t"):
+                    yield binding
+        finally:
+            response.close()
+
+    def iter_query_pages(self, query, page_size=1000, max_workers=4, order_by=None):
+        """
+        Execute a SELECT query window by window and yield the bindings of all windows in order
+        The query is extended by a stable ORDER BY (unless it has one already) as well as by LIMIT and OFFSET.
+        Up to max_workers windows are requested concurrently - the iteration stops at the first incomplete window.
+        :param query: the SELECT query (without LIMIT / OFFSET)
+        :param page_size: the number of bindings per window
+        :param max_workers: the maximal number of windows requested concurrently
+        :param order_by: the ORDER BY expression - by default all projected variables (required for SELECT *)
+        :return: a generator of the bindings (as returned by query())
+        """
+        query = self._ordered_query(query, order_by)
+
+        def fetch(offset):
+            return list(self.iter_query("{} LIMIT {} OFFSET {}".format(query, page_size, offset)))
+
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        pending = deque()
+        try:
+            next_offset = 0
+            for _ in range(max_workers):
+                pending.append(executor.submit(fetch, next_offset))
+                next_offset += page_size
+            while pending:
+                bindings = pending.popleft().result()
+                for binding in bindings:
+                    yield binding
+                if len(bindings) < page_size:
+                    break
+                pending.append(executor.submit(fetch, next_offset))
+                next_offset += page_size
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    @staticmethod
+    def _ordered_query(query, order_by):
+        normalized = normalize_query(query)
+        if re.search(r"\b(LIMIT|OFFSET)\s+\d+\s*$", normalized, re.IGNORECASE):
+            raise ValueError("The query to be paged must not be limited already")
+        if re.search(r"\bORDER\s+BY\b", normalized, re.IGNORECASE):
+            return normalized
+        if order_by is None:
+            match = SELECT_PROJECTION.search(normalized)
+            variables = re.findall(r"\?\w+", PROJECTED_EXPRESSION.sub(r"\1", match.group(1))) if match is not None else []
+            if not variables:
+                raise ValueError("The order of the windows can not be derived from the query - please specify order_by")
+            order_by = " ".join(variables)
+        return "{} ORDER BY {}".format(normalized, order_by)
 
     def _get_vocab(self):
         return "{}/vocabs".format(self.NEXUS_NAMESPACE)
@@ -91,3 +210,107 @@ class BlazegraphClient(object):
         response = self.query(query)
         result = [i.get("rel").get("value") for i in response]
         return result
+
+    def get_reverse_relations_many(self, uuids, chunk_size=200, max_workers=4):
+        """
+        Will return the entities related to each of the given entities - with one query per chunk of uuids
+        :param uuids: the entities
+        :param chunk_size: the maximal number of uuids of one query (as VALUES clause)
+        :param max_workers: the maximal number of queries executed concurrently
+        :return: a dict of uuid to the list of all the relations to the entity (as returned by get_reverse_relations)
+        """
+        uuids = list(dict.fromkeys(uuids))
+        chunks = [uuids[index:index + chunk_size] for index in range(0, len(uuids), chunk_size)]
+        relations = dict((uuid, []) for uuid in uuids)
+
+        def query_chunk(chunk):
+            values = " ".join("\"{}\"^^xsd:string".format(uuid.replace("\\", "\\\\").replace("\"", "\\\"")) for uuid in chunk)
+            query = "prefix xsd: <{xsd}>\n" \
+                    "SELECT ?uuid ?rel" \
+                    " WHERE {{" \
+                    "VALUES ?uuid {{ {values} }} " \
+                    "?s <{uuid_pred}> ?uuid. " \
+                    "?rel ?p ?s" \
+                    "}}".format(xsd=XSD_URI, values=values, uuid_pred=self._get_uuid_predicate())
+            return [(binding["uuid"]["value"], binding["rel"]["value"]) for binding in self.iter_query(query)]
+
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            for result in executor.map(query_chunk, chunks):
+                for uuid, relation in result:
+                    relations.setdefault(uuid, []).append(relation)
+        finally:
+            executor.shutdown(wait=True)
+        return relations
+
+
+def _iter_json_bindings(chunks):
+    """Incrementally parses the "bindings" array of a SPARQL JSON result given as chunks of text"""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = None
+    exhausted = False
+    while True:
+        if position is None:
+            match = BINDINGS_START.search(buffer)
+            if match is not None:
+                buffer = buffer[match.end():]
+                position = 0
+                continue
+        else:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position < len(buffer):
+                if buffer[position] == "]":
+                    return
+                try:
+                    binding, end = decoder.raw_decode(buffer, position)
+                except ValueError:
+                    # the binding is not complete yet
+                    if exhausted:
+                        raise
+                else:
+                    yield binding
+                    position = end
+                    continue
+        if exhausted:
+            if position is None:
+                return
+            raise ValueError("The SPARQL result ended within the bindings")
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+        elif position is None:
+            buffer += chunk
+        else:
+            # the parsed bindings are only cut off once per chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+
+
+def _iter_lines(chunks):
+    """Splits chunks of text into lines (including their line breaks)"""
+    pending = ""
+    for chunk in chunks:
+        lines = (pending + chunk).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    if pending:
+        yield pending
+
+
+def _iter_tabular_bindings(chunks, delimiter):
+    lines = _iter_lines(chunks)
+    if delimiter == "\t":
+        header = next(lines, None)
+        if header is None:
+            return
+        variables = [variable.lstrip("?") for variable in header.rstrip("\r\n").split("\t")]
+        for line in lines:
+            line = line.rstrip("\r\n")
+            if line:
+                yield dict((variable, value) for variable, value in zip(variables, line.split("\t")) if value)
+    else:
+        for row in csv.DictReader(lines):
+            yield dict((variable, value) for variable, value in row.items() if value)
@@ -0,0 +1,114 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+
+
+
+import copy
+import threading
+from collections import OrderedDict
+
+
+class ConditionalHttpClient(object):
+    """Decorates a raw HttpClient (raw=True) with conditional GETs.
+
+    The validators (ETag / Last-Modified) and the decoded body of every GET response are kept for up to max_size urls.
+    The next GET of the same url sends If-None-Match / If-Modified-Since - if the server answers with 304, the locally
+    stored body is returned and neither the document has to be transferred nor parsed again.
+    All other methods are passed through and their responses are decoded the same way as by the non-raw HttpClient.
+    """
+
+    def __init__(self, raw_http_client, max_size=1000):
+        self._http_client = raw_http_client
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.not_modified = 0
+        self.modified = 0
+        self.bytes_saved = 0
+
+    def get(self, url, headers=None, **kwargs):
+        with self._lock:
+            entry = self._entries.get(url)
+        request_headers = dict(headers) if headers else {}
+        if entry is not None:
+            etag, last_modified, _, _ = entry
+            if etag is not None:
+                request_headers["If-None-Match"] = etag
+            if last_modified is not None:
+                request_headers["If-Modified-Since"] = last_modified
+        response = self._http_client.get(url, headers=request_headers, **kwargs)
+        if response is None:
+            return None
+        if response.status_code == 304 and entry is not None:
+            with self._lock:
+                self.not_modified += 1
+                self.bytes_saved += entry[3]
+                if url in self._entries:
+                    self._entries.pop(url)
+                    self._entries[url] = entry
+            return copy.deepcopy(entry[2])
+        result = self._decode(response)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        with self._lock:
+            self.modified += 1
+            self._entries.pop(url, None)
+            if result is not None and (etag is not None or last_modified is not None):
+                self._entries[url] = (etag, last_modified, copy.deepcopy(result), len(response.content))
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return result
+
+    def put(self, url, *args, **kwargs):
+        return self._decode(self._http_client.put(url, *args, **kwargs))
+
+    def post(self, url, *args, **kwargs):
+        return self._decode(self._http_client.post(url, *args, **kwargs))
+
+    def patch(self, url, *args, **kwargs):
+        return self._decode(self._http_client.patch(url, *args, **kwargs))
+
+    def delete(self, url, *args, **kwargs):
+        return self._decode(self._http_client.delete(url, *args, **kwargs))
+
+    @staticmethod
+    def _decode(response):
+        if response is None or response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json() if response.content else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.not_modified + self.modified
+            return {
+                "hits": self.not_modified,
+                "misses": self.modified,
+                "size": len(self._entries),
+                "hit_ratio": float(self.not_modified) / total if total else 0.0,
+                "bytes_saved": self.bytes_saved
+            }
+
+    def __getattr__(self, name):
+        return getattr(self._http_client, name)
@@ -21,12 +21,22 @@
 
 
 import fnmatch
+import hashlib
 import json
 import os
 import os.path
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-from pyxus.utils.generic_data_upload_utils import GenericDataUploadUtils
+from pyxus.resources.entity import Context, Entity, Schema
+from pyxus.utils.dependency_graph import topological_levels
+from pyxus.utils.generic_data_upload_utils import GenericDataUploadUtils, string_types
 from pyxus.utils.schema_or_context_data import SchemaOrContextData
+from pyxus.utils.turtle_schema_transformer import iter_turtle_instances
+
+REFERENCE_PATTERN = re.compile(r"/(schemas|contexts)/([^/\s]+)/([^/\s]+)/([^/\s]+)/([^/?#\s]+)")
+CHECKSUM_SUFFIX = ".chksum"
 
 
 def recursive_find_matching(root_path, pattern):
@@ -58,26 +68,227 @@ class DataUploadUtils(GenericDataUploadUtils):
         update_if_already_exists -- if an already existing schema/context shall be updated.
         publish -- if the created or updated schema/context shall be published immediately (required for instance generation)
         """
+        schema_data = self._load_schema_or_context_data(file_path)
+        return creation_function(schema_data, force_domain_creation, update_if_already_exists, publish)
+
+    def _load_schema_or_context_data(self, file_path):
         with open(file_path) as x:
             file_content = x.read()
             file_content = self._process_content(file_content)
             raw_content = self._fill_placeholders(file_content)
             content = json.loads(raw_content)
-            schema_data = SchemaOrContextData.by_filepath(file_path, content)
-            return creation_function(schema_data, force_domain_creation, update_if_already_exists, publish)
+            return SchemaOrContextData.by_filepath(file_path, content)
+
+    def create_schemas_and_contexts_by_directory(self, schema_root=None, context_root=None, force_domain_creation=False,
+                                                 update_if_already_exists=False, publish=False, max_workers=4):
+        """Create or revise all schemas and contexts found below the given directories in the order of their dependencies.
+
+        The dependencies are derived from the "imports" and the "@context" references of the files. All schemas and
+        contexts of one dependency level are uploaded concurrently before they are published together - the next level
+        is only started once the publications are completed.
+
+        Arguments:
+        schema_root -- directory containing the schemas (following the file path conventions)
+        context_root -- directory containing the contexts (following the file path conventions)
+        force_domain_creation -- if the organizations and domains declared as part of the schemas/contexts shall be created automatically
+        update_if_already_exists -- if already existing schemas/contexts shall be updated.
+        publish -- if the created or updated schemas/contexts shall be published immediately
+        max_workers -- the maximal number of concurrent uploads
+
+        Returns the SchemaOrContextData of all schemas and contexts in upload order
+        """
+        entries = {}
+        for kind, root, creation_function in (("schemas", schema_root, self.create_schema), ("contexts", context_root, self.create_context)):
+            if root is not None:
+                for file_path in sorted(recursive_find_matching(root, "*.json")):
+                    data = self._load_schema_or_context_data(file_path)
+                    entries[(kind, data.organization, data.domain, data.name, data.version)] = (creation_function, data)
+        if force_domain_creation:
+            # created upfront - concurrent uploads would otherwise race for the creation of the same domain
+            for organization, domain in sorted(set((key[1], key[2]) for key in entries)):
+                self._create_organization_and_domain(organization, domain, "Created by upload of {}/{}".format(organization, domain))
+
+        def upload(key):
+            creation_function, data = entries[key]
+            return creation_function(data, False, update_if_already_exists, False)
 
-    def create_instance_by_file(self, file_path, fail_if_linked_instance_is_missing=True):
+        def publish_uploaded(key):
+            _, data = entries[key]
+            entity_class, repository = (Schema, self._client.schemas) if key[0] == "schemas" else (Context, self._client.contexts)
+            entity = entity_class.create_new(data.organization, data.domain, data.name, data.version, data.content)
+            self._publish_schema_or_context(repository, entity, data)
+
+        dependencies = dict((key, self._find_references(entries[key][1].content)) for key in entries)
+        uploaded = []
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            for level in topological_levels(dependencies):
+                uploaded.extend(executor.map(upload, level))
+                if publish:
+                    # the publications of a level are submitted at once - Nexus does not offer a bulk publication
+                    list(executor.map(publish_uploaded, level))
+        finally:
+            executor.shutdown(wait=True)
+        return uploaded
+
+    @staticmethod
+    def _find_references(content):
+        """Returns the (kind, organization, domain, name, version) of all schemas and contexts referenced by "imports" or "@context" """
+        references = set()
+
+        def collect(value):
+            if isinstance(value, list):
+                for item in value:
+                    collect(item)
+            elif isinstance(value, dict):
+                walk(value)
+            elif isinstance(value, string_types):
+                match = REFERENCE_PATTERN.search(value)
+                if match is not None:
+                    references.add(match.groups())
+
+        def walk(element):
+            if isinstance(element, list):
+                for item in element:
+                    walk(item)
+            elif isinstance(element, dict):
+                for key in element:
+                    if key in ("@context", "imports"):
+                        collect(element[key])
+                    else:
+                        walk(element[key])
+
+        walk(content)
+        return references
+
+    def create_instance_by_file(self, file_path, fail_if_linked_instance_is_missing=True, use_checksums=False):
         """Create a new instance for the provided data
 
         Arguments:
             file_path -- path to the location of the file to be uploaded as instance
             fully_qualify -- if True, prefixes are resolved and the JSON-LD to be uploaded will be interpretable as JSON
                              (but with non-human-friendly, fully qualified keys)
+            use_checksums -- if True, the upload is skipped (without any request) if the file did not change since the
+                             last upload recorded in its .chksum file - the .chksum file is written after every upload
         """
         with open(os.path.abspath(file_path)) as metadata_file:
             file_content = metadata_file.read()
             schema_data = SchemaOrContextData.by_filepath(file_path, None)
-            self.create_instance(file_content, schema_data, fail_if_linked_instance_is_missing)
+            if use_checksums:
+                source_hash = self._source_hash(file_path)
+                if self._read_checksum_manifest(file_path, source_hash) is not None:
+                    self.logger.debug("Skipping %s because it did not change since the last upload", file_path)
+                    return None
+            instance, hashcode = self.upload_instance(file_content, schema_data, fail_if_linked_instance_is_missing)
+            if use_checksums:
+                self._write_checksum_manifest(file_path, source_hash, instance, hashcode)
+            return instance
+
+    def create_instances_by_directory(self, root_path, fail_if_linked_instance_is_missing=True, max_workers=4, use_checksums=False):
+        """Create or update all instances found below root_path in the order of the links between them (see create_instances)
+
+        Arguments:
+            root_path -- directory containing the instances (following the file path conventions)
+            max_workers -- the maximal number of concurrent uploads
+            use_checksums -- if True, the files which did not change since their last upload (according to their .chksum
+                             files) are skipped - their links are resolved by the ids recorded in the .chksum files
+
+        Returns the created or updated instances in upload order (skipped files are not part of it)
+        """
+        instances = []
+        sources = []
+        for file_path in sorted(recursive_find_matching(root_path, "*.json")):
+            with open(os.path.abspath(file_path)) as metadata_file:
+                file_content = metadata_file.read()
+            schema_data = SchemaOrContextData.by_filepath(file_path, None)
+            if use_checksums:
+                source_hash = self._source_hash(file_path)
+                manifest = self._read_checksum_manifest(file_path, source_hash)
+                if manifest is not None:
+                    self.logger.debug("Skipping %s because it did not change since the last upload", file_path)
+                    self._prime_identifier(file_content, schema_data, manifest)
+                    continue
+                sources.append((file_path, source_hash))
+            instances.append((file_content, schema_data))
+
+        def on_uploaded(index, instance, hashcode):
+            self._write_checksum_manifest(sources[index][0], sources[index][1], instance, hashcode)
+
+        return self.create_instances(instances, fail_if_linked_instance_is_missing, max_workers,
+                                     on_uploaded if use_checksums else None)
+
+    def create_instances_by_turtle_file(self, file_path, fail_if_linked_instance_is_missing=True, max_workers=4):
+        """Create or update an instance for every subject of a turtle file (see iter_turtle_instances)
+
+        The instances are converted lazily and uploaded concurrently - not more than twice as many instances as
+        there are workers are pending at any time.
+
+        Arguments:
+            file_path -- path to the turtle file (following the file path conventions of the instances)
+            max_workers -- the maximal number of concurrent uploads
+
+        Returns the created or updated instances in the order of the file
+        """
+        schema_data = SchemaOrContextData.by_filepath(file_path, None)
+        uploaded = []
+        pending = deque()
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            with open(os.path.abspath(file_path), "rb") as turtle:
+                for content in iter_turtle_instances(turtle):
+                    if len(pending) >= 2 * max_workers:
+                        uploaded.append(pending.popleft().result())
+                    pending.append(executor.submit(self.create_instance, content, schema_data, fail_if_linked_instance_is_missing))
+            while pending:
+                uploaded.append(pending.popleft().result())
+        finally:
+            executor.shutdown(wait=True)
+        return uploaded
+
+    def _source_hash(self, file_path):
+        # the namespace is part of the hash - the same file uploaded to another Nexus has to be uploaded again
+        source = "{}/{}\n{}".format(self._client.config.NEXUS_NAMESPACE, self._client.config.NEXUS_PREFIX,
+                                     Entity.get_hasher().checksum_file(file_path))
+        return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _read_checksum_manifest(file_path, source_hash):
+        """Returns the manifest recorded by the last upload of the file if the file did not change since then"""
+        try:
+            with open(file_path + CHECKSUM_SUFFIX) as manifest_file:
+                manifest = json.load(manifest_file)
+        except (IOError, OSError, ValueError):
+            return None
+        if not isinstance(manifest, dict) or manifest.get("source") != source_hash or manifest.get("@id") is None:
+            return None
+        return manifest
+
+    @staticmethod
+    def _write_checksum_manifest(file_path, source_hash, instance, hashcode):
+        if instance is None:
+            return
+        # neither the revision nor the @id require a stale (lazily refreshed) instance to be reloaded
+        if not instance.is_stale() and (instance.data is None or "@id" not in instance.data):
+            return
+        manifest = {
+            "source": source_hash,
+            "hashcode": hashcode,
+            "id": instance.id,
+            "@id": instance.get_self_link(),
+            "revision": instance.get_revision()
+        }
+        with open(file_path + CHECKSUM_SUFFIX, "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=4)
+
+    def _prime_identifier(self, file_content, schema_data, manifest):
+        """Makes the id of a skipped instance available for the links of the uploaded ones"""
+        try:
+            identifier = self._find_identifier(json.loads(file_content))
+        except ValueError:
+            return
+        if identifier is not None:
+            schema_path = "{}/{}/{}/{}".format(schema_data.organization, schema_data.domain, schema_data.name, schema_data.version)
+            self._id_cache.put(self._identifier_query(schema_path, identifier), manifest["@id"])
 
     @staticmethod
     def clear_all_checksums(path):
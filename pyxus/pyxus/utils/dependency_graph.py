@@ -0,0 +1,45 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+
+
+
+def topological_levels(dependencies):
+    """Groups the nodes of a dependency graph into levels which can be processed one after the other.
+
+    Every node only depends on nodes of previous levels, so the nodes within one level can be processed concurrently.
+
+    Arguments:
+        dependencies -- dict of node -> iterable of the nodes it depends on. Dependencies to nodes which are not part of
+                        the graph (e.g. already existing ones) are ignored.
+    Returns the list of levels - each of them a sorted list of nodes.
+    Raises a ValueError if the dependencies are cyclic.
+    """
+    remaining = dict((node, set(d for d in dependencies[node] if d in dependencies and d != node)) for node in dependencies)
+    levels = []
+    while remaining:
+        level = sorted(node for node in remaining if not remaining[node])
+        if not level:
+            raise ValueError("Cyclic dependencies between {}".format(", ".join(sorted(str(node) for node in remaining))))
+        levels.append(level)
+        for node in level:
+            del remaining[node]
+        for node_dependencies in remaining.values():
+            node_dependencies.difference_update(level)
+    return levels
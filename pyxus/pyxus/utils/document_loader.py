@@ -0,0 +1,167 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+#
+#
+
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from pyld import jsonld
+
+try:
+    string_types = basestring  # Python 2
+except NameError:
+    string_types = str  # Python 3
+
+
+class DocumentNotCachedError(Exception):
+    def __init__(self, url):
+        super(DocumentNotCachedError, self).__init__("The document {} is not cached (offline mode)".format(url))
+        self.url = url
+
+
+class CachingDocumentLoader(object):
+    """JSON-LD document loader serving remote contexts from an in-memory and (optionally) an on-disk cache.
+
+    Documents are fetched only once - by the fallback loader (pyld's default loader unless specified) - and kept for
+    the lifetime of the loader (and across runs if a cache directory is given). In offline mode, documents which are not
+    cached raise a DocumentNotCachedError instead of being fetched.
+
+    Arguments:
+        cache_dir -- directory for the persistent cache (None for an in-memory cache only)
+        offline -- if True, no document is fetched remotely
+        fallback -- the loader used for documents which are not cached yet
+    """
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, cache_dir=None, offline=False, fallback=None):
+        self._cache_dir = cache_dir
+        self._offline = offline
+        self._fallback = fallback
+        self._documents = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if cache_dir is not None and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def __call__(self, url, options=None):
+        key = self._key(url)
+        with self._lock:
+            document = self._documents.get(key)
+        if document is None:
+            document = self._read_from_disk(key)
+            if document is not None:
+                with self._lock:
+                    self._documents[key] = document
+        if document is not None:
+            with self._lock:
+                self.hits += 1
+            return {"contextUrl": None, "documentUrl": url, "document": document}
+        with self._lock:
+            self.misses += 1
+        if self._offline:
+            raise DocumentNotCachedError(url)
+        self.logger.debug("Fetching remote document %s", url)
+        remote = self._load_remotely(url, options)
+        self.seed(url, remote["document"])
+        return remote
+
+    def _load_remotely(self, url, options):
+        fallback = self._fallback
+        if fallback is None:
+            fallback = jsonld.requests_document_loader() if hasattr(jsonld, "requests_document_loader") else jsonld.load_document
+        try:
+            return fallback(url, options) if options is not None else fallback(url)
+        except TypeError:
+            # the document loaders of pyld < 2.0 only take the url
+            return fallback(url)
+
+    def seed(self, url, document):
+        """Put a document into the cache - it is served for the given url without any further request"""
+        if isinstance(document, string_types):
+            document = json.loads(document)
+        key = self._key(url)
+        with self._lock:
+            self._documents[key] = document
+        if self._cache_dir is not None:
+            self._write_to_disk(key, url, document)
+
+    def seed_from_repository(self, context_repository, subpath=None):
+        """Put all (non-deprecated) contexts of a ContextRepository into the cache
+
+        Returns the number of cached contexts
+        """
+        count = 0
+        for context in context_repository.iter(subpath, resolved=True):
+            if context is not None and context.data is not None and context.data.get("@id") is not None:
+                self.seed(context.data["@id"], context.data)
+                count += 1
+        return count
+
+    def install(self):
+        """Make Entity.fully_qualify use this loader"""
+        from pyxus.resources.entity import Entity
+        Entity.document_loader = self
+        return self
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+        if self._cache_dir is not None:
+            for file_name in os.listdir(self._cache_dir):
+                if file_name.endswith(".json"):
+                    os.remove(os.path.join(self._cache_dir, file_name))
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._documents),
+                    "hit_ratio": float(self.hits) / total if total else 0.0}
+
+    @staticmethod
+    def _key(url):
+        return url.split("#", 1)[0]
+
+    def _file_path(self, key):
+        return os.path.join(self._cache_dir, "{}.json".format(hashlib.sha1(key.encode("utf-8")).hexdigest()))
+
+    def _read_from_disk(self, key):
+        if self._cache_dir is None:
+            return None
+        try:
+            with open(self._file_path(key)) as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        return entry.get("document") if entry.get("url") == key else None
+
+    def _write_to_disk(self, key, url, document):
+        # written to a temporary file first - concurrent readers never see a partially written document
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self._cache_dir, suffix=".tmp")
+        with os.fdopen(file_descriptor, "w") as f:
+            json.dump({"url": key, "document": document}, f)
+        replace = getattr(os, "replace", os.rename)
+        replace(temp_path, self._file_path(key))
@@ -0,0 +1,129 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+#
+#
+
+"""Fast path of the full qualification (JSON-LD expansion and compaction with an empty context).
+
+Most instances either are already fully qualified or use a flat context which only declares prefixes. For these,
+expansion + compaction boils down to replacing the prefixes of the keys, the types and the ids - and to the
+normalization done by the compaction (null values are dropped, single-element arrays are unwrapped, keys are sorted).
+Everything else (remote or nested contexts, keyword aliases, terms, @vocab/@base, lists, value objects with types or
+languages, blank nodes, relative IRIs...) is left to the full pyld algorithm.
+"""
+
+try:
+    string_types = basestring  # Python 2
+except NameError:
+    string_types = str  # Python 3
+
+_SUPPORTED_KEYWORDS = ("@id", "@type")
+_PREFIX_DELIMITERS = ("/", "#")
+
+
+class _Unsupported(Exception):
+    pass
+
+
+def fully_qualify(data):
+    """Returns the fully qualified form of the document or None if it needs the full JSON-LD algorithm"""
+    if not isinstance(data, dict):
+        return None
+    try:
+        prefixes = _prefixes(data.get("@context"))
+        node = _node(data, prefixes, top_level=True)
+    except _Unsupported:
+        return None
+    if not any(not key.startswith("@") for key in node) and "@type" not in node:
+        # nodes without properties are dropped from the top level by the expansion
+        return None
+    return node
+
+
+def _prefixes(context):
+    if context is None:
+        return {}
+    if not isinstance(context, dict):
+        raise _Unsupported()
+    for prefix, iri in context.items():
+        # only prefixes which are usable as such in JSON-LD 1.0 and 1.1 alike
+        if not prefix or prefix.startswith("@") or ":" in prefix or not isinstance(iri, string_types) \
+                or iri.startswith("@") or not iri.endswith(_PREFIX_DELIMITERS) or ":" not in iri:
+            raise _Unsupported()
+    return context
+
+
+def _expand_iri(value, prefixes, vocab):
+    if not isinstance(value, string_types):
+        raise _Unsupported()
+    if vocab and value in prefixes:
+        return prefixes[value]
+    prefix, separator, suffix = value.partition(":")
+    if not separator or prefix == "_":
+        # relative IRIs and blank nodes
+        raise _Unsupported()
+    if prefix in prefixes and not suffix.startswith("//"):
+        return prefixes[prefix] + suffix
+    return value
+
+
+def _node(element, prefixes, top_level=False):
+    if not top_level and "@context" in element:
+        raise _Unsupported()
+    node = {}
+    for key, value in element.items():
+        if key == "@context":
+            continue
+        if key.startswith("@"):
+            if key not in _SUPPORTED_KEYWORDS:
+                raise _Unsupported()
+            if key == "@id":
+                node[key] = _expand_iri(value, prefixes, vocab=False)
+            else:
+                types = [_expand_iri(t, prefixes, vocab=True) for t in (value if isinstance(value, list) else [value])]
+                if not types:
+                    raise _Unsupported()
+                node[key] = types[0] if len(types) == 1 else types
+            continue
+        iri = _expand_iri(key, prefixes, vocab=True)
+        if iri in node:
+            # e.g. a prefixed and a fully qualified key for the same property
+            raise _Unsupported()
+        if value is None:
+            continue
+        if isinstance(value, list):
+            values = [_value(v, prefixes) for v in value if v is not None]
+            node[iri] = values[0] if len(values) == 1 else values
+        else:
+            node[iri] = _value(value, prefixes)
+    return dict((key, node[key]) for key in sorted(node))
+
+
+def _value(value, prefixes):
+    if isinstance(value, dict):
+        if "@value" in value:
+            if len(value) != 1 or value["@value"] is None or isinstance(value["@value"], (dict, list)):
+                raise _Unsupported()
+            return value["@value"]
+        return _node(value, prefixes)
+    if isinstance(value, list):
+        # lists of lists
+        raise _Unsupported()
+    return value
@@ -20,29 +20,80 @@
 #
 
 
+import copy
 import json
 import logging
 import re
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 
 import pystache
 from requests.exceptions import HTTPError
 
 from pyxus.client import NexusException
 from pyxus.resources.entity import Organization, Domain, Instance, Schema, Context, Entity
+from pyxus.utils.dependency_graph import topological_levels
+from pyxus.utils.identifier_cache import IdentifierCache
+
+try:
+    string_types = basestring  # Python 2
+    from urllib import quote
+except NameError:
+    string_types = str  # Python 3
+    from urllib.parse import quote
+
+SCHEMA_IDENTIFIER = "http://schema.org/identifier"
+RESOLVE_PATTERN = re.compile(r"\{\{resolve (.*\})\}\}$")
+RESOLVE_ID_PATTERN = re.compile(r"\{\{resolve_id (.*?\})\}\}")
+RESOLVE_BY_IDENTIFIER_PATTERN = re.compile(r"\{\{resolve_by_identifier (.*?) (.*?)\}\}$")
+
 
 class ResolveByIdentifierError(Exception):
     def __init__(self, message, path):
         super(ResolveByIdentifierError, self).__init__(message)
         self.path=path
 
+
+def _weak_listener(utils, repository):
+    # the repository of a long-lived client must neither keep the utils (and their id cache) alive nor notify them forever
+    reference = weakref.ref(utils)
+
+    def listener(operation, entity):
+        target = reference()
+        if target is None:
+            repository.remove_listener(listener)
+        else:
+            target._on_instance_written(operation, entity)
+    return listener
+
+
 class GenericDataUploadUtils(object):
     _client = None
 
-    def __init__(self, nexus_client, upload_fully_qualified=True):
+    def __init__(self, nexus_client, upload_fully_qualified=True, id_cache=None):
+        """
+        Arguments:
+            id_cache -- the cache for the resolved identifiers (e.g. a SqliteIdentifierCache to share them between
+                        processes and runs). By default, they are kept in memory.
+        """
         self.logger = logging.getLogger(__name__)
         self._client = nexus_client
         self._upload_fully_qualified = upload_fully_qualified
-        self._id_cache = {}
+        self._id_cache = id_cache if id_cache is not None else IdentifierCache()
+        self._listener = None
+        if nexus_client is not None:
+            self._listener = _weak_listener(self, nexus_client.instances)
+            nexus_client.instances.add_listener(self._listener)
+
+    def _on_instance_written(self, operation, instance):
+        if operation == "delete":
+            self._id_cache.invalidate_instance(instance.id)
+
+    def close(self):
+        """Stops listening to the instance repository of the client (happens as well once the utils are garbage collected)"""
+        if self._listener is not None:
+            self._client.instances.remove_listener(self._listener)
+            self._listener = None
 
     def create_instance(self, data, schema_data, fail_if_linked_instance_is_missing=True):
         """Create a new instance for the provided data
@@ -52,17 +103,29 @@ class GenericDataUploadUtils(object):
             fully_qualify -- if True, prefixes are resolved and the JSON-LD to be uploaded will be interpretable as JSON
                              (but with non-human-friendly, fully qualified keys)
         """
-        raw_json = self.resolve_entities(data if not isinstance(data, dict) else json.dumps(data), fail_if_linked_instance_is_missing)
-        raw_json = self._fill_placeholders(raw_json)
-        fully_qualified_json = Entity.fully_qualify(json.loads(raw_json))
+        return self.upload_instance(data, schema_data, fail_if_linked_instance_is_missing)[0]
+
+    def upload_instance(self, data, schema_data, fail_if_linked_instance_is_missing=True):
+        """Create or update an instance for the provided data (see create_instance)
+
+        Returns the resulting instance together with the hashcode of the uploaded document
+        """
+        if isinstance(data, dict):
+            content = self.resolve_content(copy.deepcopy(data), fail_if_linked_instance_is_missing)
+        else:
+            try:
+                content = self.resolve_content(json.loads(data), fail_if_linked_instance_is_missing)
+            except ValueError:
+                # the template is only valid JSON after its placeholders have been filled
+                content = json.loads(self._fill_placeholders(self.resolve_entities(data, fail_if_linked_instance_is_missing)))
         if not self._upload_fully_qualified:
-            final_json = json.loads(raw_json) if not isinstance(raw_json, dict) else raw_json
+            final_json = content
+            fully_qualified_json = Entity.fully_qualify(copy.deepcopy(content))
         else:
-            final_json = fully_qualified_json
+            final_json = fully_qualified_json = Entity.fully_qualify(content)
         schema_identifier = "http://schema.org/identifier"
         hashcode_field = "http://hbp.eu/internal#hashcode"
-        if self._upload_fully_qualified:
-            raw_json = final_json
+        raw_json = final_json
         instance = Instance.create_new(schema_data.organization, schema_data.domain, schema_data.name, schema_data.version, raw_json)
         if hashcode_field not in fully_qualified_json:
             current_hashcode = Entity.do_get_checksum(fully_qualified_json)
@@ -74,8 +137,8 @@ class GenericDataUploadUtils(object):
             identifier = fully_qualified_json.get(schema_identifier)
             result = self.handle_known_schema_identifier(schema_identifier, instance, hashcode_field, current_hashcode, identifier)
             if result is not None:
-                return result
-        return self._client.instances.create(Instance.create_new(schema_data.organization, schema_data.domain, schema_data.name, schema_data.version, raw_json))
+                return result, current_hashcode
+        return self._client.instances.create(Instance.create_new(schema_data.organization, schema_data.domain, schema_data.name, schema_data.version, raw_json)), current_hashcode
 
     def handle_known_schema_identifier(self, schema_identifier, instance, hashcode_field, current_hashcode, identifier):
         if isinstance(identifier, list):
@@ -90,7 +153,8 @@ class GenericDataUploadUtils(object):
                 result = self._client.instances.update(instance)
             else:
                 self.logger.debug("Skipping instance %s because it already exists", instance.path)
-                result = instance
+                # the existing instance carries the @id and revision (e.g. for the checksum manifest)
+                result = found_instance
             return result
         return None
 
@@ -104,29 +168,109 @@ class GenericDataUploadUtils(object):
             self._client.config.NEXUS_PREFIX), prefix=self._client.config.NEXUS_PREFIX)
 
     def resolve_identifier(self, match):
-        if match in self._id_cache:
+        key = self._cache_key(match)
+        cached = self._id_cache.get(key)
+        if cached is not None:
             self.logger.debug("resolved %s from cache", match)
-            return self._id_cache.get(match)
+            return cached
         else:
             result_list = self._client.instances.list_by_full_subpath(match + "&deprecated=false")
             if result_list is not None and result_list.results:
                 # TODO check - do we really want to select the first one if ambiguous?
                 result = result_list.results[0].result_id
-                self._id_cache[match] = result
+                self._id_cache.put(key, result)
                 return result
             else:
                 raise ResolveByIdentifierError("No entities found for {}".format(match), match)
 
+    def resolve_content(self, content, fail_if_linked_instance_is_missing):
+        """Resolve the links and fill the placeholders of an already parsed instance.
+
+        This is the structural equivalent of resolve_entities followed by _fill_placeholders: The JSON tree is walked
+        once and only the strings containing placeholders are touched. Strings consisting of a {{resolve ...}} or
+        {{resolve_by_identifier ...}} placeholder are replaced by an {"@id": ...} object, {{resolve_id ...}} placeholders
+        are replaced by the id within their string. The content is modified in place and returned.
+        """
+        links = set()
+        self._walk_strings(content, lambda value: self._collect_identifier_link(value, links))
+        if len(links) > 1:
+            self.resolve_identifiers(links)
+        return self._resolve_element(content, fail_if_linked_instance_is_missing)
+
+    @staticmethod
+    def _walk_strings(element, visit):
+        elements = [element]
+        while elements:
+            element = elements.pop()
+            if isinstance(element, dict):
+                elements.extend(element.values())
+            elif isinstance(element, list):
+                elements.extend(element)
+            elif isinstance(element, string_types):
+                visit(element)
+
+    @staticmethod
+    def _collect_identifier_link(value, links):
+        if value.startswith("{{resolve_by_identifier "):
+            match = RESOLVE_BY_IDENTIFIER_PATTERN.match(value)
+            if match is not None:
+                links.add((match.group(1).strip("/"), match.group(2).strip("/")))
+
+    def _resolve_element(self, element, fail_if_linked_instance_is_missing):
+        if isinstance(element, dict):
+            for key in list(element.keys()):
+                value = self._resolve_element(element[key], fail_if_linked_instance_is_missing)
+                if "{{" in key:
+                    del element[key]
+                    key = self._fill_placeholders(key)
+                element[key] = value
+            return element
+        if isinstance(element, list):
+            for index, value in enumerate(element):
+                element[index] = self._resolve_element(value, fail_if_linked_instance_is_missing)
+            return element
+        if isinstance(element, string_types) and "{{" in element:
+            return self._resolve_string(element, fail_if_linked_instance_is_missing)
+        return element
+
+    def _resolve_string(self, value, fail_if_linked_instance_is_missing):
+        match = RESOLVE_BY_IDENTIFIER_PATTERN.match(value)
+        if match is not None:
+            query = self._identifier_query(match.group(1).strip("/"), match.group(2).strip("/"))
+            return {"@id": self._resolve_link(query, fail_if_linked_instance_is_missing)}
+        match = RESOLVE_PATTERN.match(value)
+        if match is not None:
+            return {"@id": self._resolve_link(self._escape(match.group(1)), fail_if_linked_instance_is_missing)}
+        if "{{resolve_id " in value:
+            value = RESOLVE_ID_PATTERN.sub(lambda m: self._resolve_link(self._escape(m.group(1)), fail_if_linked_instance_is_missing), value)
+        return self._fill_placeholders(value)
+
+    @staticmethod
+    def _escape(query):
+        # the queries are cached in their JSON encoded form (as they appear within the JSON text)
+        return json.dumps(query, ensure_ascii=False)[1:-1]
+
+    def _resolve_link(self, query, fail_if_linked_instance_is_missing):
+        try:
+            replacement = self.resolve_identifier(query)
+        except ResolveByIdentifierError as e:
+            if not fail_if_linked_instance_is_missing:
+                replacement = ""
+            else:
+                raise e
+        return replacement if replacement is not None else ""
+
     def resolve_entities(self, template, fail_if_linked_instance_is_missing):
         search_pattern = r"(?<=\"\{\{resolve_by_identifier) (?P<path>.*?) (?P<identifier>.*?)(?=\}\}\")"
         replace_pattern = "\"{{{{resolve_by_identifier {} {}}}}}\""
         matches = re.findall(search_pattern, template)
+        if len(set(matches)) > 1:
+            self.resolve_identifiers((match[0], match[1].strip("/")) for match in matches)
         for match in matches:
             path = match[0].strip("/")
             identifier = match[1].strip("/")
             replace = replace_pattern.format(match[0], match[1])
-            filter_condition = "?filter=" + json.dumps({"op": "eq", "path": "http://schema.org/identifier", "value": identifier}).replace('"', '\\"')
-            template = template.replace(replace, "\"{{{{resolve /{}{}}}}}\"".format(path, filter_condition))
+            template = template.replace(replace, "\"{{{{resolve {}}}}}\"".format(self._identifier_query(path, identifier)))
 
         matches = re.findall(r"(?<=\{\{resolve ).*?\}(?=\}\})", template)
         for match in matches:
@@ -150,11 +294,202 @@ class GenericDataUploadUtils(object):
             template = template.replace("{{resolve_id " + match + "}}", replacement if replacement is not None else "")
         return template
 
+    def resolve_identifiers(self, links, max_filter_length=2000, max_chunk_size=50):
+        """Resolve many links by schema:identifier with as few requests as possible.
+
+        The links which are not cached yet are grouped by their schema path. Every group is resolved by "or" filter
+        queries - chunked to keep the URLs short. The results are put into the identifier cache, so the following
+        resolution of the {{resolve_by_identifier ...}} placeholders does not need any further request.
+
+        Arguments:
+            links -- iterable of (schema path, identifier) tuples
+            max_filter_length -- the maximal length of the url encoded filter of one request
+            max_chunk_size -- the maximal number of identifiers resolved by one request
+
+        Returns the number of newly resolved links
+        """
+        groups = {}
+        for path, identifier in links:
+            path = path.strip("/")
+            if self._id_cache.get(self._identifier_query(path, identifier)) is None:
+                groups.setdefault(path, set()).add(identifier)
+        resolved = 0
+        for path in sorted(groups):
+            for chunk in self._chunk_identifiers(sorted(groups[path]), max_filter_length, max_chunk_size):
+                pending = set(chunk)
+                filter_query = json.dumps({"op": "or", "value": [self._identifier_filter(identifier) for identifier in chunk]})
+                for instance in self._client.instances.iter("/{}".format(path), resolved=True, filter_query=filter_query, size=len(chunk)):
+                    identifier = self._find_identifier(instance.data) if instance is not None else None
+                    # the first result wins if an identifier is ambiguous - as for the single resolution
+                    if identifier in pending and instance.data.get("@id") is not None:
+                        pending.remove(identifier)
+                        self._id_cache.put(self._identifier_query(path, identifier), instance.data["@id"])
+                        resolved += 1
+        return resolved
+
+    @staticmethod
+    def _identifier_filter(identifier):
+        return {"op": "eq", "path": SCHEMA_IDENTIFIER, "value": identifier}
+
+    @staticmethod
+    def _chunk_identifiers(identifiers, max_filter_length, max_chunk_size):
+        chunk = []
+        length = 0
+        for identifier in identifiers:
+            identifier_length = len(quote(json.dumps(GenericDataUploadUtils._identifier_filter(identifier)))) + 3
+            if chunk and (len(chunk) >= max_chunk_size or length + identifier_length > max_filter_length):
+                yield chunk
+                chunk = []
+                length = 0
+            chunk.append(identifier)
+            length += identifier_length
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _cache_key(match):
+        """The identifier cache key of a resolve query - literal filters by schema:identifier share the key of the
+        equivalent {{resolve_by_identifier ...}} link (see _identifier_query)"""
+        path, separator, filter_text = match.partition("?filter=")
+        if not separator:
+            return match
+        try:
+            # the queries are JSON encoded (as they appear within the JSON text)
+            filter_query = GenericDataUploadUtils._identifier_filter_value(json.loads(json.loads('"{}"'.format(filter_text))))
+        except ValueError:
+            return match
+        if filter_query is None:
+            return match
+        return GenericDataUploadUtils._identifier_query(path.strip("/"), filter_query)
+
+    @staticmethod
+    def _identifier_filter_value(filter_query):
+        """The identifier of an "eq" filter on schema:identifier (optionally wrapped into {"filter": ...}) - None otherwise"""
+        if isinstance(filter_query, dict) and isinstance(filter_query.get("filter"), dict):
+            filter_query = filter_query["filter"]
+        if isinstance(filter_query, dict) and filter_query.get("op") == "eq" and filter_query.get("path") == SCHEMA_IDENTIFIER \
+                and isinstance(filter_query.get("value"), string_types):
+            return filter_query["value"]
+        return None
+
+    @staticmethod
+    def _identifier_query(path, identifier):
+        filter_condition = "?filter=" + json.dumps(GenericDataUploadUtils._identifier_filter(identifier)).replace('"', '\\"')
+        return "/{}{}".format(path, filter_condition)
+
+    def create_instances(self, instances, fail_if_linked_instance_is_missing=True, max_workers=4, on_uploaded=None):
+        """Create or update many instances in the order of the links between them.
+
+        All instances are scanned for their schema:identifier and their resolve links first. Instances are then uploaded
+        in waves - an instance is only uploaded after all instances of the batch it links to. The instances of one wave
+        are uploaded concurrently.
+
+        Arguments:
+            instances -- list of (data, schema_data) tuples as accepted by create_instance
+            max_workers -- the maximal number of concurrent uploads
+            on_uploaded -- optional function called with the index of the uploaded tuple, the resulting instance and the
+                           hashcode of the uploaded document
+
+        Returns the created or updated instances in upload order
+        """
+        providers = {}
+        dependencies = {}
+        for index, (data, schema_data) in enumerate(instances):
+            try:
+                content = json.loads(data) if not isinstance(data, dict) else data
+            except ValueError:
+                # a template which is only valid JSON after its placeholders have been filled (see create_instance) -
+                # it is treated as having neither an identifier nor links
+                content = None
+            schema_path = "{}/{}/{}/{}".format(schema_data.organization, schema_data.domain, schema_data.name, schema_data.version)
+            identifier = self._find_identifier(content)
+            if identifier is not None:
+                providers[(schema_path, identifier)] = index
+            dependencies[index] = self._find_linked_identifiers(content)
+        provided = dict((index, key) for key, index in providers.items())
+        # links to instances outside of the batch are resolved upfront in as few requests as possible
+        self.resolve_identifiers(set(link for links in dependencies.values() for link in links if link not in providers))
+        for index in dependencies:
+            dependencies[index] = set(providers[link] for link in dependencies[index] if link in providers)
+
+        def upload(index):
+            data, schema_data = instances[index]
+            instance, hashcode = self.upload_instance(data, schema_data, fail_if_linked_instance_is_missing)
+            if index in provided and instance is not None and instance.data is not None and "@id" in instance.data:
+                # the search index might not be up to date yet - the following waves get the id from the cache
+                self._id_cache.put(self._identifier_query(*provided[index]), instance.data["@id"])
+            if on_uploaded is not None:
+                on_uploaded(index, instance, hashcode)
+            return instance
+
+        uploaded = []
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            for wave in topological_levels(dependencies):
+                uploaded.extend(executor.map(upload, wave))
+        finally:
+            executor.shutdown(wait=True)
+        return uploaded
+
+    @staticmethod
+    def _find_identifier(content):
+        if not isinstance(content, dict):
+            return None
+        identifier = content.get(SCHEMA_IDENTIFIER)
+        if identifier is None:
+            schema_prefixes = [prefix for prefix, namespace in GenericDataUploadUtils._prefixes(content.get("@context")).items()
+                               if namespace == "http://schema.org/"]
+            for prefix in schema_prefixes:
+                if "{}:identifier".format(prefix) in content:
+                    identifier = content["{}:identifier".format(prefix)]
+                    break
+        if isinstance(identifier, list):
+            identifier = identifier[0] if identifier else None
+        return identifier
+
+    @staticmethod
+    def _prefixes(context):
+        prefixes = {}
+        for element in context if isinstance(context, list) else [context]:
+            if isinstance(element, dict):
+                prefixes.update(element)
+        return prefixes
+
+    @staticmethod
+    def _find_linked_identifiers(content):
+        """Returns the (schema path, identifier) of all instances the resolve links of the content point to"""
+        links = set()
+        if isinstance(content, dict):
+            elements = list(content.values())
+        elif isinstance(content, list):
+            elements = list(content)
+        else:
+            elements = [content]
+        while elements:
+            element = elements.pop()
+            if isinstance(element, dict):
+                elements.extend(element.values())
+            elif isinstance(element, list):
+                elements.extend(element)
+            elif isinstance(element, string_types) and "{{resolve" in element:
+                for path, identifier in re.findall(r"\{\{resolve_by_identifier (.*?) (.*?)\}\}", element):
+                    links.add((path.strip("/"), identifier.strip("/")))
+                for path, filter_query in re.findall(r"\{\{resolve(?:_id)? ([^?]*)\?filter=(.*?\})\}\}(?!\})", element):
+                    try:
+                        filter_query = json.loads(filter_query)
+                    except ValueError:
+                        continue
+                    identifier = GenericDataUploadUtils._identifier_filter_value(filter_query)
+                    if identifier is not None:
+                        links.add((path.strip("/"), identifier))
+        return links
+
     def clear_all_instances(self, subpath=None):
-        all_instances = self._client.instances.list(subpath, size=999999)
-        all_instances = self._client.instances.resolve_all(all_instances)
-        for instance in all_instances:
-            self._client.instances.delete(instance)
+        # deprecated instances are listed as well - otherwise the pages would shift while we are deleting
+        for search_result in self._client.instances.iter(subpath, size=100, deprecated=None):
+            instance = self._client.instances.resolve(search_result)
+            if instance is not None and not instance.is_deprecated():
+                self._client.instances.delete(instance)
 
     def create_schema(self, data, force_domain_creation=False, update_if_already_exists=False, publish=False):
         entity = Schema.create_new(data.organization, data.domain, data.name, data.version, data.content)
@@ -175,12 +510,7 @@ class GenericDataUploadUtils(object):
         if schema_or_context is None:
             # The schema or context does not exist yet - we create it
             if force_domain_creation:
-                organization = self._client.organizations.read(data.organization)
-                if organization is None:
-                    self._client.organizations.create(Organization.create_new(data.organization, "Created by {} {}".format(text, data.name)))
-                domain = self._client.domains.read(data.organization, data.domain)
-                if domain is None:
-                    self._client.domains.create(Domain.create_new(data.organization, data.domain, "Created by {} {}".format(text, data.name)))
+                self._create_organization_and_domain(data.organization, data.domain, "Created by {} {}".format(text, data.name))
             schema_or_context = repository.create(entity)
         elif update_if_already_exists:
             if schema_or_context.is_published():
@@ -188,10 +518,25 @@ class GenericDataUploadUtils(object):
             schema_or_context = self._client.schemas.update(data.organization, data.domain, data.name, data.version,
                                                             data.content, schema_or_context.get_revision())
         data.revision = schema_or_context.get_revision()
-        if publish and data.revision and not schema_or_context.is_published():
-            repository.publish(schema_or_context, True, data.revision)
+        data.published = schema_or_context.is_published()
+        if publish:
+            self._publish_schema_or_context(repository, schema_or_context, data)
         return data
 
+    @staticmethod
+    def _publish_schema_or_context(repository, entity, data):
+        if data.revision and not data.published:
+            repository.publish(entity, True, data.revision)
+            data.published = True
+
+    def _create_organization_and_domain(self, organization_name, domain_name, description):
+        organization = self._client.organizations.read(organization_name)
+        if organization is None:
+            self._client.organizations.create(Organization.create_new(organization_name, description))
+        domain = self._client.domains.read(organization_name, domain_name)
+        if domain is None:
+            self._client.domains.create(Domain.create_new(organization_name, domain_name, description))
+
     @staticmethod
     def _process_content(content):
         return content
@@ -0,0 +1,311 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+#
+#
+
+
+import gzip
+import json
+import threading
+import time
+from collections import deque
+
+from requests import Response, exceptions
+from requests.structures import CaseInsensitiveDict
+
+try:
+    _timer = time.perf_counter  # Python 3
+except AttributeError:
+    _timer = time.time  # Python 2
+
+try:
+    _string_types = basestring  # Python 2
+    import __builtin__ as builtins
+except NameError:
+    _string_types = str  # Python 3
+    import builtins
+
+
+class RequestNotRecordedError(Exception):
+    def __init__(self, method, url):
+        super(RequestNotRecordedError, self).__init__("The request {} {} is not part of the trace".format(method.upper(), url))
+        self.method = method
+        self.url = url
+
+
+class ReplayedError(Exception):
+    """Raised by the replay in place of a recorded exception which can not be reconstructed"""
+    def __init__(self, type_name, message):
+        super(ReplayedError, self).__init__("{}: {}".format(type_name, message))
+        self.type_name = type_name
+
+
+class TraceWriter(object):
+    """Appends the exchanges of the recording clients to a trace file - one JSON document per line (gzip compressed
+    if the path ends with .gz).
+
+    Every line is flushed right away, so the trace of an aborted run stays readable up to its last request.
+    The writer can be shared by a RecordingHttpClient and a RecordingSession (e.g. of a NexusClient and a BlazegraphClient).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = gzip.open(path, "wb") if path.endswith(".gz") else open(path, "wb")
+        self._started = _timer()
+        self._lock = threading.Lock()
+
+    def now(self):
+        """The number of seconds since the writer was opened"""
+        return _timer() - self._started
+
+    def write(self, record):
+        line = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def read_trace(path):
+    """Yields the records of a trace file in the order they were written"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        try:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line.decode("utf-8"))
+        except EOFError:
+            # the gzip trailer is missing if the writer was not closed - all flushed lines are available nevertheless
+            return
+
+
+def _request_key(method, url, body):
+    return method, url, json.dumps(body, sort_keys=True) if body is not None else None
+
+
+def _error_record(error):
+    record = {"type": type(error).__name__, "message": str(error)}
+    response = getattr(error, "response", None)
+    if isinstance(response, Response):
+        record["response"] = _response_record(response)
+    return record
+
+
+def _response_record(response):
+    content = response.content
+    return {
+        "status": response.status_code,
+        "headers": dict(response.headers) if response.headers is not None else {},
+        "content": content.decode("utf-8") if isinstance(content, bytes) else content
+    }
+
+
+def _build_response(record, url):
+    response = Response()
+    response.status_code = record["status"]
+    response.headers = CaseInsensitiveDict(record["headers"])
+    response._content = record["content"].encode("utf-8") if record["content"] is not None else b""
+    response._content_consumed = True
+    response.encoding = "utf-8"
+    response.url = url
+    return response
+
+
+def _build_error(record, url):
+    error_type = getattr(exceptions, record["type"], None)
+    if isinstance(error_type, type) and issubclass(error_type, exceptions.RequestException):
+        if "response" in record:
+            return error_type(record["message"], response=_build_response(record["response"], url))
+        return error_type(record["message"])
+    error_type = getattr(builtins, record["type"], None)
+    if isinstance(error_type, type) and issubclass(error_type, Exception):
+        try:
+            return error_type(record["message"])
+        except TypeError:
+            # e.g. UnicodeDecodeError - the constructor requires more than a message
+            pass
+    return ReplayedError(record["type"], record["message"])
+
+
+class RecordingHttpClient(object):
+    """Decorates an HttpClient and writes every request with its decoded result (or error) and timing to a trace.
+
+    Record format: {"start", "duration", "method", "url", "body", "result" | "error"} - "start" and "duration" in seconds.
+    """
+
+    def __init__(self, http_client, trace):
+        self._http_client = http_client
+        self.trace = trace
+
+    def get(self, url, *args, **kwargs):
+        return self._record("get", url, None, self._http_client.get, *args, **kwargs)
+
+    def put(self, url, *args, **kwargs):
+        return self._record("put", url, args[0] if args else None, self._http_client.put, *args, **kwargs)
+
+    def post(self, url, *args, **kwargs):
+        return self._record("post", url, args[0] if args else None, self._http_client.post, *args, **kwargs)
+
+    def patch(self, url, *args, **kwargs):
+        return self._record("patch", url, args[0] if args else None, self._http_client.patch, *args, **kwargs)
+
+    def delete(self, url, *args, **kwargs):
+        return self._record("delete", url, None, self._http_client.delete, *args, **kwargs)
+
+    def _record(self, method_name, url, body, method, *args, **kwargs):
+        start = self.trace.now()
+        record = {"start": start, "method": method_name, "url": url, "body": body}
+        try:
+            result = method(url, *args, **kwargs)
+            record["result"] = result
+            return result
+        except Exception as e:
+            record["error"] = _error_record(e)
+            raise
+        finally:
+            record["duration"] = self.trace.now() - start
+            self.trace.write(record)
+
+    def __getattr__(self, name):
+        return getattr(self._http_client, name)
+
+
+class RecordingSession(object):
+    """Decorates a requests.Session and writes every request with its response and timing to a trace.
+
+    The content of streamed responses is read completely before it is handed out, so it is recorded as well.
+    Record format: {"start", "duration", "method", "url", "body", "response": {"status", "headers", "content"} | "error"}
+    """
+
+    def __init__(self, session, trace):
+        self._session = session
+        self.trace = trace
+
+    def get(self, url, **kwargs):
+        return self.request("get", url, **kwargs)
+
+    def post(self, url, data=None, **kwargs):
+        return self.request("post", url, data=data, **kwargs)
+
+    def request(self, method, url, data=None, **kwargs):
+        start = self.trace.now()
+        record = {"start": start, "method": method.lower(), "url": url, "body": data}
+        try:
+            response = getattr(self._session, method.lower())(url, data=data, **kwargs)
+            record["response"] = _response_record(response)
+            return response
+        except Exception as e:
+            record["error"] = _error_record(e)
+            raise
+        finally:
+            record["duration"] = self.trace.now() - start
+            self.trace.write(record)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+class _Replay(object):
+
+    def __init__(self, trace, realtime=False, sleep=time.sleep):
+        self.realtime = realtime
+        self._sleep = sleep
+        self._records = {}
+        self._lock = threading.Lock()
+        self.served = 0
+        for record in (read_trace(trace) if isinstance(trace, _string_types) else trace):
+            if "result" not in record and "response" not in record and "error" not in record:
+                # written by an earlier version which did not record all exceptions - there is nothing to serve
+                continue
+            self._records.setdefault(_request_key(record["method"], record["url"], record.get("body")), deque()).append(record)
+
+    def _next(self, method, url, body):
+        with self._lock:
+            records = self._records.get(_request_key(method, url, body))
+            if not records:
+                raise RequestNotRecordedError(method, url)
+            # the recorded exchanges of the same request are served in order - the last one is repeated afterwards
+            record = records.popleft() if len(records) > 1 else records[0]
+            self.served += 1
+        if self.realtime:
+            self._sleep(record["duration"])
+        return record
+
+
+class ReplayHttpClient(_Replay):
+    """Serves the results recorded by a RecordingHttpClient instead of sending the requests.
+
+    Requests are matched by their method, url and body. The exchanges of the same request are served in the order
+    they were recorded (independent of the order of the other requests) - a request which was not recorded raises a
+    RequestNotRecordedError.
+
+    Arguments:
+        trace -- the path of the trace file (or an iterable of its records)
+        realtime -- if True, every response is delayed by the recorded duration (to reproduce the timing of the run)
+    """
+
+    def get(self, url, *args, **kwargs):
+        return self._replay("get", url, None)
+
+    def put(self, url, *args, **kwargs):
+        return self._replay("put", url, args[0] if args else None)
+
+    def post(self, url, *args, **kwargs):
+        return self._replay("post", url, args[0] if args else None)
+
+    def patch(self, url, *args, **kwargs):
+        return self._replay("patch", url, args[0] if args else None)
+
+    def delete(self, url, *args, **kwargs):
+        return self._replay("delete", url, None)
+
+    def _replay(self, method, url, body):
+        record = self._next(method, url, body)
+        if "error" in record:
+            raise _build_error(record["error"], url)
+        return record["result"]
+
+
+class ReplaySession(_Replay):
+    """Serves the responses recorded by a RecordingSession instead of sending the requests (see ReplayHttpClient)"""
+
+    def get(self, url, **kwargs):
+        return self.request("get", url, **kwargs)
+
+    def post(self, url, data=None, **kwargs):
+        return self.request("post", url, data=data, **kwargs)
+
+    def request(self, method, url, data=None, **kwargs):
+        record = self._next(method.lower(), url, data)
+        if "error" in record:
+            raise _build_error(record["error"], url)
+        return _build_response(record["response"], url)
+
+    def close(self):
+        pass
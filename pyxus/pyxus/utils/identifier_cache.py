@@ -0,0 +1,145 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+
+
+
+import os
+import sqlite3
+import threading
+import time
+
+
+class IdentifierCache(object):
+    """In-memory cache of the resolved identifier queries (query -> id of the instance) for the lifetime of the process"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query):
+        with self._lock:
+            result = self._entries.get(query)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return result
+
+    def put(self, query, instance_id):
+        with self._lock:
+            self._entries[query] = instance_id
+
+    def invalidate_instance(self, instance_id):
+        """Drops all queries resolved to the given instance - either its full id or its id relative to /data"""
+        with self._lock:
+            for query in [q for q, i in self._entries.items() if _matches(i, instance_id)]:
+                del self._entries[query]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries),
+                    "hit_ratio": float(self.hits) / total if total else 0.0}
+
+
+class SqliteIdentifierCache(IdentifierCache):
+    """Persistent cache of the resolved identifier queries in a SQLite database.
+
+    The database can be shared by several processes (e.g. parallel workers or subsequent ingestion runs) - it is
+    accessed in WAL mode which allows concurrent readers next to a writer.
+
+    Arguments:
+        path -- the location of the database file
+        ttl -- the number of seconds a resolution stays valid (None for no expiration)
+    """
+
+    def __init__(self, path, ttl=None, clock=time.time):
+        super(SqliteIdentifierCache, self).__init__()
+        self.path = path
+        self.ttl = ttl
+        self._clock = clock
+        self._connections = threading.local()
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        with connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS identifiers (query TEXT PRIMARY KEY, instance_id TEXT NOT NULL, created REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS identifiers_instance_id ON identifiers (instance_id)")
+
+    def _connection(self):
+        # sqlite connections can neither be shared between threads nor survive a fork
+        connection = getattr(self._connections, "connection", None)
+        if connection is None or self._connections.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30)
+            self._connections.connection = connection
+            self._connections.pid = os.getpid()
+        return connection
+
+    def get(self, query):
+        row = self._connection().execute("SELECT instance_id, created FROM identifiers WHERE query = ?", (query,)).fetchone()
+        if row is not None and self.ttl is not None and row[1] + self.ttl < self._clock():
+            row = None
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0]
+
+    def put(self, query, instance_id):
+        connection = self._connection()
+        with connection:
+            connection.execute("INSERT OR REPLACE INTO identifiers (query, instance_id, created) VALUES (?, ?, ?)",
+                               (query, instance_id, self._clock()))
+
+    def invalidate_instance(self, instance_id):
+        suffix = "/data/{}".format(instance_id)
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM identifiers WHERE instance_id = ? OR substr(instance_id, -?) = ?",
+                               (instance_id, len(suffix), suffix))
+
+    def clear(self):
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM identifiers")
+
+    def purge_expired(self):
+        """Removes the expired resolutions from the database"""
+        if self.ttl is not None:
+            connection = self._connection()
+            with connection:
+                connection.execute("DELETE FROM identifiers WHERE created < ?", (self._clock() - self.ttl,))
+
+    def stats(self):
+        size = self._connection().execute("SELECT count(*) FROM identifiers").fetchone()[0]
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "size": size,
+                    "hit_ratio": float(self.hits) / total if total else 0.0}
+
+
+def _matches(cached_id, instance_id):
+    return cached_id == instance_id or cached_id.endswith("/data/{}".format(instance_id))
@@ -0,0 +1,209 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+#
+#
+
+
+import functools
+import json
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+try:
+    _timer = time.perf_counter  # Python 3
+except AttributeError:
+    _timer = time.time  # Python 2
+
+
+class _OperationMetrics(object):
+
+    def __init__(self, buckets):
+        self.count = 0
+        self.errors = 0
+        self.bytes = 0
+        self.duration_sum = 0.0
+        self.bucket_counts = [0] * (len(buckets) + 1)
+
+
+class Metrics(object):
+    """Latency histograms, request / byte / error counters per entity type and operation as well as cache statistics.
+
+    Repositories record their operations if the Metrics are passed to them (NexusClient(metrics=...)) - without,
+    the instrumentation costs a single attribute check per call. Exporters added by add_exporter are notified about
+    every single observation (push, e.g. StatsdExporter), snapshot() / to_prometheus() provide the aggregated values
+    (pull).
+
+    Arguments:
+        buckets -- the upper bounds (in seconds) of the latency histogram buckets
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._operations = {}
+        self._caches = {}
+        self._exporters = []
+        self._lock = threading.Lock()
+
+    def observe(self, entity_type, operation, duration, error=False, size=None):
+        with self._lock:
+            metrics = self._operations.get((entity_type, operation))
+            if metrics is None:
+                metrics = self._operations[(entity_type, operation)] = _OperationMetrics(self.buckets)
+            metrics.count += 1
+            metrics.duration_sum += duration
+            if error:
+                metrics.errors += 1
+            if size:
+                metrics.bytes += size
+            index = 0
+            while index < len(self.buckets) and duration > self.buckets[index]:
+                index += 1
+            metrics.bucket_counts[index] += 1
+        for exporter in self._exporters:
+            exporter.observe(entity_type, operation, duration, error, size)
+
+    def measure(self, entity_type, operation, sent, received, method, *args, **kwargs):
+        """Executes the method and records its duration, whether it failed and the JSON size of the transferred document
+
+        Arguments:
+            sent -- optional function (args) returning the document sent by the method
+            received -- optional function (result) returning the document received by the method
+        """
+        size = self._size(sent(args)) if sent is not None else None
+        start = _timer()
+        error = True
+        result = None
+        try:
+            result = method(*args, **kwargs)
+            error = False
+            return result
+        finally:
+            duration = _timer() - start
+            if received is not None and not error:
+                size = self._size(received(result))
+            self.observe(entity_type, operation, duration, error, size)
+
+    @staticmethod
+    def _size(document):
+        return len(json.dumps(document)) if document is not None else None
+
+    def register_cache(self, name, cache):
+        """Includes the stats() of a cache (e.g. ReadCache, IdentifierCache, QueryCache) in the snapshots"""
+        with self._lock:
+            self._caches[name] = cache
+
+    def add_exporter(self, exporter):
+        """Registers an exporter which is notified by observe(entity_type, operation, duration, error, size)"""
+        self._exporters.append(exporter)
+
+    def snapshot(self):
+        with self._lock:
+            operations = {}
+            for (entity_type, operation), metrics in self._operations.items():
+                cumulative = 0
+                buckets = []
+                for bound, count in zip(self.buckets + (float("inf"),), metrics.bucket_counts):
+                    cumulative += count
+                    buckets.append((bound, cumulative))
+                operations.setdefault(entity_type, {})[operation] = {
+                    "count": metrics.count,
+                    "errors": metrics.errors,
+                    "bytes": metrics.bytes,
+                    "duration_sum": metrics.duration_sum,
+                    "duration_buckets": buckets
+                }
+            caches = dict(self._caches)
+        return {"operations": operations, "caches": dict((name, cache.stats()) for name, cache in caches.items())}
+
+    def reset(self):
+        with self._lock:
+            self._operations.clear()
+
+    def to_prometheus(self, prefix="pyxus"):
+        return to_prometheus(self.snapshot(), prefix)
+
+
+def to_prometheus(snapshot, prefix="pyxus"):
+    """Renders a snapshot in the Prometheus text exposition format"""
+    lines = []
+    operations = sorted((entity_type, operation, values) for entity_type, by_operation in snapshot["operations"].items()
+                        for operation, values in by_operation.items())
+    lines.append("# TYPE {}_request_duration_seconds histogram".format(prefix))
+    for entity_type, operation, values in operations:
+        labels = 'entity="{}",operation="{}"'.format(entity_type, operation)
+        for bound, count in values["duration_buckets"]:
+            lines.append('{}_request_duration_seconds_bucket{{{},le="{}"}} {}'.format(
+                prefix, labels, "+Inf" if bound == float("inf") else repr(bound), count))
+        lines.append("{}_request_duration_seconds_sum{{{}}} {}".format(prefix, labels, repr(values["duration_sum"])))
+        lines.append("{}_request_duration_seconds_count{{{}}} {}".format(prefix, labels, values["count"]))
+    for name, key in (("requests_total", "count"), ("request_errors_total", "errors"), ("request_bytes_total", "bytes")):
+        lines.append("# TYPE {}_{} counter".format(prefix, name))
+        for entity_type, operation, values in operations:
+            lines.append('{}_{}{{entity="{}",operation="{}"}} {}'.format(prefix, name, entity_type, operation, values[key]))
+    caches = sorted(snapshot["caches"].items())
+    for name, key, metric_type in (("cache_hits_total", "hits", "counter"), ("cache_misses_total", "misses", "counter"),
+                                   ("cache_hit_ratio", "hit_ratio", "gauge")):
+        lines.append("# TYPE {}_{} {}".format(prefix, name, metric_type))
+        for cache, stats in caches:
+            if key in stats:
+                lines.append('{}_{}{{cache="{}"}} {}'.format(prefix, name, cache, stats[key]))
+    return "\n".join(lines) + "\n"
+
+
+class StatsdExporter(object):
+    """Pushes every observation to a StatsD-style callback send(name, value, metric_type) - with the metric types
+    "ms" (timer) and "c" (counter)
+
+    Arguments:
+        send -- the callback, e.g. a thin wrapper around a StatsD client
+        prefix -- the prefix of all metric names
+    """
+
+    def __init__(self, send, prefix="pyxus"):
+        self._send = send
+        self.prefix = prefix
+
+    def observe(self, entity_type, operation, duration, error, size):
+        name = "{}.{}.{}".format(self.prefix, entity_type.lower(), operation)
+        self._send(name + ".duration", duration * 1000.0, "ms")
+        self._send(name + ".requests", 1, "c")
+        if error:
+            self._send(name + ".errors", 1, "c")
+        if size:
+            self._send(name + ".bytes", size, "c")
+
+
+def instrumented(operation, sent=None, received=None):
+    """Records the calls of a repository method in the metrics of the repository (if there are any)
+
+    Arguments:
+        operation -- the name of the operation (read, list, create, update, delete, publish)
+        sent / received -- see Metrics.measure (the args start with the repository)
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if self._metrics is None:
+                return method(self, *args, **kwargs)
+            return self._metrics.measure(self.constructor.__name__, operation, sent, received, method, self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,131 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+#
+#
+
+
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# string literals and IRIs are kept as they are - whitespace and comments outside of them are normalized
+_TOKEN = re.compile(r'"""(?:[^\\]|\\.)*?"""|\'\'\'(?:[^\\]|\\.)*?\'\'\'|"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|<[^<>"{}|^`\\\s]*>'
+                    r'|#[^\n]*|\s+|[^\s"\'<#]+|.', re.DOTALL)
+
+
+def normalize_query(query):
+    """Returns the query with comments removed and all whitespace (outside of literals and IRIs) collapsed"""
+    tokens = []
+    for token in _TOKEN.findall(query):
+        if token.startswith("#") or token.isspace():
+            if tokens and tokens[-1] != " ":
+                tokens.append(" ")
+        else:
+            tokens.append(token)
+    return "".join(tokens).strip()
+
+
+class QueryCache(object):
+    """Thread-safe cache of SPARQL query results with time-to-live and size bounded LRU eviction.
+
+    The results are kept as the raw response content. The entries are keyed by the normalized query text, so queries
+    differing only in their formatting share an entry. Blazegraph is updated by Nexus asynchronously - the TTL bounds
+    how long a result can be outdated, writes through pyxus can additionally invalidate the cache (see
+    BlazegraphClient.invalidate_cache).
+
+    Arguments:
+        max_size -- the maximal number of cached results
+        max_bytes -- the maximal sum of the size of the cached results
+        ttl -- the number of seconds a result stays valid
+    """
+
+    def __init__(self, max_size=1000, max_bytes=64 * 1024 * 1024, ttl=60, clock=time.time):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def get(self, query):
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] < self._clock():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.bytes_saved += len(entry[0])
+            # move to the end - the first entry is always the least recently used one
+            del self._entries[key]
+            self._entries[key] = entry
+            return entry[0]
+
+    def put(self, query, content):
+        if content is None or len(content) > self.max_bytes:
+            return
+        key = normalize_query(query)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (content, self._clock() + self.ttl)
+            self._bytes += len(content)
+            while len(self._entries) > self.max_size or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[0])
+
+    def invalidate(self, query=None):
+        """Drops the result of the given query - or all results if no query is given"""
+        with self._lock:
+            if query is None:
+                self._entries.clear()
+                self._bytes = 0
+            else:
+                self._remove(normalize_query(query))
+
+    def clear(self):
+        self.invalidate()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "bytes": self._bytes,
+                "bytes_saved": self.bytes_saved,
+                "hit_ratio": float(self.hits) / total if total else 0.0
+            }
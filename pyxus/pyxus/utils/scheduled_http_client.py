@@ -0,0 +1,191 @@
+#  Copyright 2018 - 2021 Swiss Federal Institute of Technology Lausanne (EPFL)
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#  http://www.apache.org/licenses/LICENSE-2.0.
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+#  This open source software code was developed in part or in whole in the
+#  Human Brain Project, funded from the European Union's Horizon 2020
+#  Framework Programme for Research and Innovation under
+#  Specific Grant Agreements No. 720270, No. 785907, and No. 945539
+#  (Human Brain Project SGA1, SGA2 and SGA3).
+#
+#
+
+
+import logging
+import random
+import threading
+import time
+
+from requests import exceptions
+
+THROTTLING_STATUS_CODES = (429, 503)
+RETRYABLE_STATUS_CODES = (429, 502, 503, 504)
+
+
+class RequestBudget(object):
+    """Rate limit (token bucket) and adaptive concurrency limit (AIMD) for the requests to one endpoint.
+
+    The concurrency limit grows by one per limit's worth of successful requests (additive increase) and is halved
+    when the server throttles (multiplicative decrease) - at most once per cooldown period, so a burst of throttled
+    requests which were in flight at the same time only counts once.
+
+    Arguments:
+        rate -- the maximal number of requests per second (None for no rate limit)
+        burst -- the number of requests which can be sent at once after an idle period
+        concurrency -- the initial concurrency limit
+        min_concurrency / max_concurrency -- the bounds of the concurrency limit
+        cooldown -- the minimal number of seconds between two decreases
+    """
+
+    def __init__(self, rate=None, burst=1, concurrency=4, min_concurrency=1, max_concurrency=32, cooldown=1.0,
+                 clock=time.time, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.limit = float(concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.cooldown = cooldown
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(burst)
+        self._refilled = clock()
+        self._decreased = None
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self.throttled = 0
+
+    def acquire(self):
+        with self._condition:
+            while self._in_flight >= int(self.limit):
+                self._condition.wait()
+            self._in_flight += 1
+        if self.rate is not None:
+            self._take_token()
+
+    def _take_token(self):
+        with self._condition:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+            self._refilled = now
+            # the token is reserved right away - waiting requests queue up in the order of their reservation
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            self._sleep(wait)
+
+    def release(self, throttled=False):
+        with self._condition:
+            self._in_flight -= 1
+            now = self._clock()
+            if throttled:
+                self.throttled += 1
+                if self._decreased is None or now - self._decreased >= self.cooldown:
+                    self._decreased = now
+                    self.limit = max(float(self.min_concurrency), self.limit / 2)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            return {"limit": int(self.limit), "in_flight": self._in_flight, "throttled": self.throttled}
+
+
+class ScheduledHttpClient(object):
+    """Decorates an HttpClient with rate and concurrency control as well as with retries of the reading requests.
+
+    GET requests are scheduled by the read budget, all writing requests (which Nexus receives through the
+    alternative_endpoint_writing namespace) by the write budget. Throttled (429 / 503) and timed out requests shrink
+    the concurrency of their budget. GET requests are retried on throttling, timeouts, connection errors and gateway
+    errors with exponentially growing, jittered delays (or the delay requested by a Retry-After header).
+    """
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, http_client, read_budget=None, write_budget=None, max_retries=4, backoff=0.5, max_backoff=30.0,
+                 sleep=time.sleep, random_generator=random.random):
+        self._http_client = http_client
+        self.read_budget = read_budget if read_budget is not None else RequestBudget()
+        self.write_budget = write_budget if write_budget is not None else RequestBudget()
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._sleep = sleep
+        self._random = random_generator
+        self.retries = 0
+
+    def get(self, url, *args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return self._execute(self.read_budget, self._http_client.get, url, *args, **kwargs)
+            except (exceptions.HTTPError, exceptions.Timeout, exceptions.ConnectionError) as e:
+                if attempt >= self.max_retries or not self._is_retryable(e):
+                    raise
+                delay = self._retry_after(e)
+                if delay is None:
+                    # "full jitter" - the retries of concurrent requests are spread over the whole interval
+                    delay = self._random() * min(self.max_backoff, self.backoff * 2 ** attempt)
+                attempt += 1
+                self.retries += 1
+                self.logger.debug("Retrying GET %s in %.2fs (attempt %d): %s", url, delay, attempt, e)
+                self._sleep(delay)
+
+    def put(self, url, *args, **kwargs):
+        return self._execute(self.write_budget, self._http_client.put, url, *args, **kwargs)
+
+    def post(self, url, *args, **kwargs):
+        return self._execute(self.write_budget, self._http_client.post, url, *args, **kwargs)
+
+    def patch(self, url, *args, **kwargs):
+        return self._execute(self.write_budget, self._http_client.patch, url, *args, **kwargs)
+
+    def delete(self, url, *args, **kwargs):
+        return self._execute(self.write_budget, self._http_client.delete, url, *args, **kwargs)
+
+    @staticmethod
+    def _execute(budget, method, *args, **kwargs):
+        budget.acquire()
+        throttled = False
+        try:
+            return method(*args, **kwargs)
+        except (exceptions.HTTPError, exceptions.Timeout) as e:
+            throttled = isinstance(e, exceptions.Timeout) or ScheduledHttpClient._status_code(e) in THROTTLING_STATUS_CODES
+            raise
+        finally:
+            budget.release(throttled)
+
+    @staticmethod
+    def _status_code(error):
+        response = getattr(error, "response", None)
+        return response.status_code if response is not None else None
+
+    @staticmethod
+    def _is_retryable(error):
+        if isinstance(error, exceptions.HTTPError):
+            return ScheduledHttpClient._status_code(error) in RETRYABLE_STATUS_CODES
+        return True
+
+    def _retry_after(self, error):
+        response = getattr(error, "response", None)
+        value = response.headers.get("Retry-After") if response is not None and response.headers is not None else None
+        try:
+            return min(self.max_backoff, float(value)) if value is not None else None
+        except ValueError:
+            # HTTP dates are not supported - the jittered backoff is used instead
+            return None
+
+    def stats(self):
+        return {"reads": self.read_budget.stats(), "writes": self.write_budget.stats(), "retries": self.retries}
+
+    def __getattr__(self, name):
+        return getattr(self._http_client, name)
@@ -27,6 +27,7 @@ import os
 
 class SchemaOrContextData(object):
     revision = None
+    published = False
 
     @staticmethod
     def _recursively_check_for_this(json_element):
@@ -21,8 +21,17 @@
 
 
 import json
+import numbers
+from decimal import Decimal
 
 from rdflib.graph import Graph
+from rdflib.namespace import RDF
+from rdflib.term import BNode, Literal, URIRef
+
+try:
+    text_type = unicode  # Python 2
+except NameError:
+    text_type = str  # Python 3
 
 
 def transform_turtle_to_jsonld(turtle):
@@ -31,6 +40,84 @@ def transform_turtle_to_jsonld(turtle):
     return json.loads(content_jsonld)
 
 
+def iter_turtle_instances(turtle, rdf_format="turtle"):
+    """Lazily yields one expanded JSON-LD node per subject of an RDF document.
+
+    The nodes are built directly from the parsed graph (without serializing it to a JSON-LD string first). Blank nodes
+    referenced exactly once are embedded into the node referencing them. All other blank nodes (unreferenced, shared
+    by several references or only reachable within a cycle of blank nodes) are yielded as nodes of their own with an
+    "@id" of "_:..." and are referenced by it.
+
+    Arguments:
+        turtle -- the document as string, as file object or as already parsed rdflib Graph
+        rdf_format -- the RDF format of the document
+    """
+    if isinstance(turtle, Graph):
+        graph = turtle
+    elif hasattr(turtle, "read"):
+        graph = Graph().parse(source=turtle, format=rdf_format)
+    else:
+        graph = Graph().parse(data=turtle, format=rdf_format)
+    seen = set()
+    embeddable = []
+    embedded = set()
+    for subject in graph.subjects():
+        if subject in seen:
+            continue
+        seen.add(subject)
+        if _is_embeddable(graph, subject):
+            embeddable.append(subject)
+        else:
+            yield _node(graph, subject, embedded)
+    # a cycle of blank nodes which are referenced once each is not reached by any other node
+    for subject in embeddable:
+        if subject not in embedded:
+            embedded.add(subject)
+            yield _node(graph, subject, embedded)
+
+
+def _is_embeddable(graph, subject):
+    if not isinstance(subject, BNode):
+        return False
+    references = graph.subject_predicates(subject)
+    return next(references, None) is not None and next(references, None) is None
+
+
+def _node(graph, subject, embedded, root=True):
+    node = {}
+    if not isinstance(subject, BNode):
+        node["@id"] = text_type(subject)
+    elif root:
+        node["@id"] = subject.n3()
+    types = []
+    for predicate, value in graph.predicate_objects(subject):
+        if predicate == RDF.type and isinstance(value, URIRef):
+            types.append(text_type(value))
+        else:
+            node.setdefault(text_type(predicate), []).append(_value(graph, value, embedded))
+    if types:
+        node["@type"] = types
+    return dict((key, node[key]) for key in sorted(node))
+
+
+def _value(graph, value, embedded):
+    if isinstance(value, Literal):
+        if value.language:
+            return {"@language": value.language, "@value": text_type(value)}
+        if value.datatype is not None:
+            native = value.toPython()
+            if not isinstance(native, numbers.Number) or isinstance(native, Decimal):
+                native = text_type(value)
+            return {"@type": text_type(value.datatype), "@value": native}
+        return {"@value": text_type(value)}
+    if isinstance(value, BNode):
+        if value in embedded or not _is_embeddable(graph, value):
+            return {"@id": value.n3()}
+        embedded.add(value)
+        return _node(graph, value, embedded, root=False)
+    return {"@id": text_type(value)}
+
+
 def transform_turtle_to_jsonld_schema(turtle_shapes):
     return _wrap(transform_turtle_to_jsonld(turtle_shapes))
 